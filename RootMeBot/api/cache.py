@@ -0,0 +1,110 @@
+"""Module for the persistent cache of API responses"""
+import asyncio
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from constants import CACHE_EVICT_INTERVAL, CACHE_PATH, CACHE_RETENTION
+
+
+class CachedResponse():
+    """Class that represents a response body stored in the cache"""
+    def __init__(self, body: bytes, etag: Optional[str], last_modified: Optional[str], expires: float) -> None:
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+    def is_fresh(self) -> bool:
+        """Whether the response can be used without asking the API"""
+        return time.time() < self.expires
+
+    def conditional_headers(self) -> dict:
+        """Headers to revalidate the response with the API"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache():
+    """Class that stores API responses on disk, with a TTL and their validators
+
+    The connection is only used from a dedicated thread, so commits don't block the event loop."""
+
+    def __init__(self, path: str = CACHE_PATH, retention: float = CACHE_RETENTION) -> None:
+        self.thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache')
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        #No fsync on commit, losing the last responses on a crash only costs requests
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, body BLOB NOT NULL, etag TEXT, last_modified TEXT, expires REAL NOT NULL)"
+        )
+        self.connection.commit()
+
+        self.retention = retention
+        self.evicted = time.time()
+
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(request_key: tuple) -> str:
+        """Serializes a request key from ApiRootMe.request_key"""
+        return json.dumps(request_key)
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.thread, func, *args)
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        """Retreives a response, fresh or not"""
+        return await self.run(self._get, key)
+
+    async def store(self, key: str, body: bytes, etag: Optional[str], last_modified: Optional[str], ttl: float) -> None:
+        """Stores a fresh response"""
+        await self.run(self._store, key, body, etag, last_modified, ttl)
+
+    async def refresh(self, key: str, ttl: float) -> None:
+        """Extends the life of a response the API told us is still valid"""
+        await self.run(self._refresh, key, ttl)
+
+    def _get(self, key: str) -> Optional[CachedResponse]:
+        row = self.connection.execute(
+            "SELECT body, etag, last_modified, expires FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+
+        if not row:
+            return None
+        return CachedResponse(*row)
+
+    def _store(self, key: str, body: bytes, etag: Optional[str], last_modified: Optional[str], ttl: float) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO responses (key, body, etag, last_modified, expires) VALUES (?, ?, ?, ?, ?)",
+            (key, body, etag, last_modified, time.time() + ttl)
+        )
+        self._evict()
+        self.connection.commit()
+
+    def _refresh(self, key: str, ttl: float) -> None:
+        self.connection.execute("UPDATE responses SET expires = ? WHERE key = ?", (time.time() + ttl, key))
+        self.connection.commit()
+
+    def _evict(self) -> None:
+        """Deletes the responses expired for longer than the retention, at most every CACHE_EVICT_INTERVAL"""
+        now = time.time()
+        if now - self.evicted < CACHE_EVICT_INTERVAL:
+            return
+        self.evicted = now
+        deleted = self.connection.execute("DELETE FROM responses WHERE expires < ?", (now - self.retention,)).rowcount
+        if deleted:
+            print(f"Response cache : {deleted} expired responses deleted")
+
+    def __str__(self) -> str:
+        return f"Response cache : {self.hits} hits, {self.revalidated} revalidated, {self.misses} misses"
@@ -6,12 +6,13 @@ from datetime import datetime
 
 from database.models.auteur_model import Auteur
 from database.models.challenge_model import Challenge
-from database.models.validation_model import Validation
 from database.models.base_model import Base
 
 
 def extract_auteur(user_data: dict) -> Auteur:
-    """Parses data to create an Auteur"""
+    """Parses data to create an Auteur
+
+    Validations are kept as a {challenge id: date} dict in validation_dates, see make_validations"""
     idx, user_name, user_score = int(user_data['id_auteur']), user_data['nom'], int(user_data['score'])
 
     try:
@@ -22,20 +23,20 @@ def extract_auteur(user_data: dict) -> Auteur:
 
     aut = Auteur(idx=idx, username=user_name, score=user_score, rank=user_rank)
 
-    for validation in user_data['validations']:
-
-        c = Challenge(idx=int(validation['id_challenge']))
-        d = datetime.strptime(validation["date"], "%Y-%m-%d %H:%M:%S")
-
-        v_idx = str(aut.idx) + "-" + validation['id_challenge']
-
-        v = Validation(idx = v_idx, date=d)
-        v.validation_auteur = aut
-        v.validation_challenge = c
-
+    aut.validation_dates = {
+        int(validation['id_challenge']): datetime.strptime(validation["date"], "%Y-%m-%d %H:%M:%S")
+        for validation in user_data['validations']
+    }
 
     return aut
 
+def make_validations(aut_idx: int, validation_dates: dict) -> list[dict]:
+    """Rows of the validations table for some of the validation_dates of an Auteur"""
+    return [
+        {'auteur_id': aut_idx, 'challenge_id': chall_idx, 'date': date}
+        for chall_idx, date in validation_dates.items()
+    ]
+
 def extract_auteurs_short(users_data: list) -> list[AuteurShort]:
     """Parses data to create a list of AuteurShort"""
 
@@ -52,11 +53,6 @@ def extract_auteurs_short(users_data: list) -> list[AuteurShort]:
 def extract_challenge(challenge_data: dict, idx) -> Challenge:
     """Parses data to create a Challenge"""
 
-    if challenge_data == 404:
-        # To fix
-        return None
-
-
     #some challenges are list of 1 elements for some reason...
     if type(challenge_data) == list:
         challenge_data = challenge_data[0]
@@ -76,6 +72,10 @@ def extract_challenge(challenge_data: dict, idx) -> Challenge:
 
     return challenge
 
+def has_next_page(data: list) -> bool:
+    """Checks the links following a page of results for a next page"""
+    return any(isinstance(link, dict) and link.get('rel') == 'next' for link in data[1:])
+
 def extract_page_challenges(data: list) -> list[ChallengeShort]:
     """Parses data to create a list of ChallengeShort"""
     challs = []
@@ -1,16 +1,25 @@
 import asyncio
 import time
 import aiohttp
-import json
-from json.decoder import JSONDecodeError
 import functools
 import uuid
+from collections import deque
 from datetime import datetime, timedelta
+from typing import AsyncIterator
 
 from asyncio.exceptions import TimeoutError
 from aiohttp.client_exceptions import ServerDisconnectedError, ClientConnectorError, ClientPayloadError, ClientOSError
 
+try:
+    #Faster on big auteur payloads, the standard library is used otherwise
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+from api.cache import ResponseCache
 from api.extract import *
+from api.ratelimit import RateLimiter, make_rate_limiter, parse_retry_after
+from api.scheduler import PriorityEntry, RequestScheduler
 
 from database.models.auteur_model import Auteur
 from database.models.challenge_model import Challenge
@@ -18,50 +27,65 @@ from database.models.base_model import Base
 
 from classes.auteur import *
 from classes.challenge import *
+from classes.enums import ApiStatus
 from classes.error import *
 from constants import *
 
 Auteurs = list[AuteurShort]
 Challenges = list[ChallengeShort]
 
-class PriorityEntry(object):
-
-    def __init__(self, priority, data):
-        self.data = data
-        self.priority = priority
+class ApiResponse():
+    """Outcome of a request handled by the worker, the body is only set for ApiStatus.OK"""
 
-    def __lt__(self, other):
-        return self.priority < other.priority
+    def __init__(self, status: ApiStatus, body: bytes = b'', etag: str = None, last_modified: str = None):
+        self.status = status
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
 
 
 class ApiRootMe():
     """Class that represents the API"""
-    def __init__(self):
+    def __init__(self, rate_limiter: RateLimiter = None, cache: ResponseCache = None):
         self.bot = None
-        self.semaphore = asyncio.BoundedSemaphore(24)
-        self.connector = aiohttp.TCPConnector(limit=24, ttl_dns_cache=300)
+        self.semaphore = asyncio.BoundedSemaphore(API_MAX_CONNECTIONS)
+        self.connector = aiohttp.TCPConnector(limit=API_MAX_CONNECTIONS, ttl_dns_cache=300)
         self.session = aiohttp.ClientSession(connector=self.connector)
         self.lang = DEFAULT_LANG
-        self.timeout = aiohttp.ClientTimeout(total=6)
+        self.timeout = aiohttp.ClientTimeout(total=API_TIMEOUT)
         self.ban = datetime.now()
+        self.rate_limiter = rate_limiter or make_rate_limiter()
+        self.cache = cache or ResponseCache()
 
-        self.queue = asyncio.PriorityQueue()
+        self.queue = RequestScheduler(on_expired=self.expire)
 
         self.requests = {}
+        self.in_flight = {}
+        self.workers = []
+
+    def start_workers(self, count: int = API_WORKERS) -> list[asyncio.Task]:
+        """Starts a pool of workers draining the same queue"""
+        print(f"Starting {count} workers...")
+        self.workers = [asyncio.create_task(self.worker(i)) for i in range(count)]
+        return self.workers
 
-    async def worker(self):
-        print(f"Starting worker...")
+    async def worker(self, idx: int = 0):
+        print(f"Starting worker {idx}...")
         while True:
 
             check = False
 
-
             data = await self.queue.get()
 
             prio, req = data.priority, data.data
 
             url, params, key, method = req
 
+            entry = self.requests[key]
+            entry['started'] = True
+            headers = entry['headers']
+            timeout = entry['timeout'] or self.timeout
+
             if method == 'GET':
                 method_http = self.session.get
             elif method == 'HEAD':
@@ -70,186 +94,378 @@ class ApiRootMe():
 
             while not check:
 
+                await self.rate_limiter.acquire()
 
+                if data.expired(time.monotonic()) or entry['future'].done():
+                    #Expired or abandoned while waiting for the rate limit
+                    break
 
-                await asyncio.sleep(4.5)
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] Treating item in queue : {key} -> {url} + {params} - (Priority {prio})")
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] Worker {idx} treating item in queue : {key} -> {url} + {params} - (Priority {prio})")
                 try:
-                    async with method_http(url, params=params, cookies=cookies_rootme) as r:
+                    async with self.semaphore, method_http(url, params=params, headers=headers, cookies=cookies_rootme, timeout=timeout) as r:
+
+                        if r.status in (429, 503):
+                            retry_after = parse_retry_after(r.headers.get('Retry-After'))
+                            print(f'Status : {r.status} - slowing down (Retry-After {retry_after})')
+                            self.rate_limiter.throttled(retry_after)
+                            continue
 
                         # HEAD
                         if method == 'HEAD':
-                            if r.status == 200:
-                                data = '200'
-                                check = True
-                            elif r.status == 404:
-                                data = '404'
+                            if r.status in (200, 404):
+                                response = ApiResponse(ApiStatus(r.status))
                                 check = True
-                            continue
 
                         # GET
-                        if r.status == 200:
-                            data = await r.text()
-                            check = True
-                        elif r.status == 401:
-                            data = 'PREMIUM'
+                        elif r.status == 200:
+                            body = await r.read()
+                            response = ApiResponse(ApiStatus.OK, body, r.headers.get('ETag'), r.headers.get('Last-Modified'))
                             check = True
 
-                        # search for non existent username are now 404..
-                        elif r.status == 404:
-                            data = '404'
+                        # 401 is a premium challenge, search for non existent username are now 404..
+                        elif r.status in (304, 401, 404):
+                            response = ApiResponse(ApiStatus(r.status))
                             check = True
+
+                        if check:
+                            self.rate_limiter.success()
                         else:
                             print(f'Status : {r.status} - restarting')
-                            await asyncio.sleep(15)
-                            check = False
+                            self.rate_limiter.failed()
 
                 except ClientOSError as e:
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Got {e.__class__.__name__}, retrying in 15s...")
-                    await asyncio.sleep(15)
+                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Got {e.__class__.__name__}, retrying in {API_ERROR_DELAY}s...")
+                    self.rate_limiter.failed()
                     check = False
                 except (ServerDisconnectedError, ClientPayloadError) as e:
                     print(f"[{datetime.now().strftime('%H:%M:%S')}] Got {e.__class__.__name__}, retrying...")
                     check = False
+                except TimeoutError:
+                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Request {key} timed out after {timeout.total}s, retrying...")
+                    self.rate_limiter.throttled()
+                    check = False
 
 
-            self.requests[key]['result'] = data
-            self.requests[key]['event'].set()
+            if check:
+                self.resolve(key, response)
+            elif entry['future'].done():
+                self.discard(key)
+            else:
+                self.queue.expire(data)
 
             self.queue.task_done()
 
-    async def get(self, url, params, priority=1):
-        key = uuid.uuid4().hex
+    def resolve(self, key: str, response: ApiResponse) -> None:
+        """Hands the response of a request to its waiters"""
+        entry = self.discard(key)
+        if not entry['future'].done():
+            entry['future'].set_result(response)
+
+    def discard(self, key: str) -> dict:
+        """Forgets a request, later identical requests will be sent again"""
+        entry = self.requests.pop(key)
+        if self.in_flight.get(entry['coalesce_key']) == key:
+            del self.in_flight[entry['coalesce_key']]
+        return entry
+
+    def abandon(self, key: str) -> None:
+        """Called when a waiter goes away, the request is dropped once nobody waits for it"""
+        entry = self.requests.get(key)
+        if not entry:
+            return
+
+        entry['waiters'] -= 1
+        if entry['waiters']:
+            return
+
+        entry['future'].cancel()
+        if not entry['started']:
+            self.queue.remove(entry['queue_entry'])
+            self.discard(key)
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Request {key} cancelled")
+        else:
+            #Already picked up by a worker, which drops it unless it is being sent. Nobody can join it anymore
+            del self.in_flight[entry['coalesce_key']]
+
+    def expire(self, queue_entry: PriorityEntry) -> None:
+        """Called by the scheduler when a request is dropped past its deadline"""
+        url, _, key, _ = queue_entry.data
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] Request {key} for {url} expired")
+        self.resolve(key, ApiResponse(ApiStatus.EXPIRED))
+
+    def request_key(self, method: str, url: str, params: dict) -> tuple:
+        """Identifies a request, ignoring the timestamp used as a cache-buster"""
+        return (method, url, tuple(sorted((k, v) for k, v in params.items() if not (k.isdigit() and k == v))))
+
+    async def request(self, url, params, method, priority=1, headers=None, deadline=None, timeout=None) -> ApiResponse:
+        """Enqueues a request, or joins an identical one already in flight
+
+        If a deadline (in seconds) is given and the request can't be sent in time, RequestExpired is raised.
+        The timeout (in seconds) applies to each HTTP attempt, API_TIMEOUT by default.
+        If the caller is cancelled, the request is removed from the queue unless someone else waits for it."""
+
+        #Conditional requests only coalesce with the same conditions, others can't use a 304
+        coalesce_key = (self.request_key(method, url, params), tuple(sorted((headers or {}).items())))
+        if deadline is not None:
+            deadline = time.monotonic() + deadline
+        if timeout is not None:
+            timeout = aiohttp.ClientTimeout(total=timeout)
+
+        if (key := self.in_flight.get(coalesce_key)) is not None:
+            entry = self.requests[key]
+            entry['waiters'] += 1
+
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Request for {url} joined {key} (Priority {priority})")
+
+            queue_entry = entry['queue_entry']
+            if priority < queue_entry.priority:
+                self.queue.reprioritize(queue_entry, priority)
+
+            #The request must live as long as its most patient waiter
+            if deadline is None or queue_entry.deadline is None:
+                self.queue.set_deadline(queue_entry, None)
+            else:
+                self.queue.set_deadline(queue_entry, max(deadline, queue_entry.deadline))
+
+            if timeout is None or entry['timeout'] is None:
+                entry['timeout'] = None
+            else:
+                entry['timeout'] = max(timeout, entry['timeout'], key=lambda t: t.total)
+        else:
+            key = uuid.uuid4().hex
+
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Request for {url} added to queue -> {key} (Priority {priority})")
+
+            queue_entry = PriorityEntry(priority, (url, params, key, method), deadline)
+            entry = {
+                'future': asyncio.get_running_loop().create_future(),
+                'queue_entry': queue_entry,
+                'waiters': 1,
+                'started': False,
+                'coalesce_key': coalesce_key,
+                'headers': headers,
+                'timeout': timeout
+                }
+            self.requests[key] = entry
+            self.in_flight[coalesce_key] = key
+            await self.queue.put(queue_entry)
+
+        try:
+            #Shielded so one waiter going away doesn't cancel the others
+            response = await asyncio.shield(entry['future'])
+        except asyncio.CancelledError:
+            self.abandon(key)
+            raise
+
+        if response.status == ApiStatus.EXPIRED:
+            raise RequestExpired(url)
+
+        return response
+
+    async def get(self, url, params, priority=1, ttl=None, deadline=None, timeout=None):
+        """GET request, returns the decoded JSON, raises ApiError for another status or an undecodable body
+
+        When a TTL is given the response is served from and stored in the cache"""
+
+        if ttl is None:
+            response = await self.request(url, params, 'GET', priority, deadline=deadline, timeout=timeout)
+        else:
+            response = await self.get_cached(url, params, priority, ttl, deadline, timeout)
 
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] Request for {url} added to queue -> {key} (Priority {priority})")
+        if response.status != ApiStatus.OK:
+            raise ApiError(url, response.status)
 
-        event = asyncio.Event()
-        self.requests[key] = {}
-        self.requests[key]['event'] = event
-        obj = PriorityEntry(priority, (url, params, key, 'GET'))
-        await self.queue.put(obj)
-        await event.wait()
         try:
-            result = json.loads(self.requests[key]['result'])
-        except JSONDecodeError:
-            print(f"Got invalid response > {self.requests[key]['result']}")
-            result = ''
+            return loads(response.body)
+        except ValueError:
+            print(f"Got invalid response > {response.body[:200]}")
+            raise ApiError(url, None)
+
+
+    async def get_cached(self, url, params, priority, ttl, deadline=None, timeout=None) -> ApiResponse:
+        """Serves a GET from the cache, revalidating it with the API once expired, or always with a ttl of 0"""
 
-        del self.requests[key]
+        cache_key = self.cache.make_key(self.request_key('GET', url, params))
+        cached = await self.cache.get(cache_key)
 
-        return result
+        if cached and ttl and cached.is_fresh():
+            self.cache.hits += 1
+            return ApiResponse(ApiStatus.OK, cached.body)
 
+        headers = cached.conditional_headers() if cached else None
+        response = await self.request(url, params, 'GET', priority, headers, deadline, timeout)
 
-    async def head(self, url, priority=1):
-        key = uuid.uuid4().hex
+        if response.status == ApiStatus.NOT_MODIFIED and not cached:
+            #Only conditional requests get a 304, ask again for the body
+            response = await self.request(url, params, 'GET', priority, None, deadline, timeout)
 
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] Request for {url} added to queue -> {key} (Priority {priority})")
+        if response.status == ApiStatus.NOT_MODIFIED:
+            self.cache.revalidated += 1
+            await self.cache.refresh(cache_key, ttl)
+            return ApiResponse(ApiStatus.OK, cached.body)
 
-        event = asyncio.Event()
-        self.requests[key] = {}
-        self.requests[key]['event'] = event
-        obj = PriorityEntry(priority, (url, {}, key, 'HEAD'))
-        await self.queue.put(obj)
-        await event.wait()
+        if response.status == ApiStatus.OK:
+            self.cache.misses += 1
+            await self.cache.store(cache_key, response.body, response.etag, response.last_modified, ttl)
 
-        result = self.requests[key]['result']
-        del self.requests[key]
+        return response
 
-        return result
+    async def head(self, url, priority=1, deadline=None, timeout=API_HEAD_TIMEOUT) -> ApiStatus:
+        response = await self.request(url, {}, 'HEAD', priority, deadline=deadline, timeout=timeout)
+        return response.status
 
 
 
 
-    async def get_user_by_id(self, idx: int, priority=1) -> Auteur:
-        """Retreives an Auteur by id"""
+    async def get_user_by_id(self, idx: int, priority=1, deadline=None) -> Auteur:
+        """Retreives an Auteur by id, None if it doesn't exist or can't be read"""
 
         params = {
             str(int(time.time())): str(int(time.time())),
             }
 
 
-        user_data = await self.get(f"{api_base_url}{auteurs_path}/{idx}", params, priority)
+        try:
+            user_data = await self.get(f"{api_base_url}{auteurs_path}/{idx}", params, priority, deadline=deadline)
+        except ApiError as error:
+            if error.status != ApiStatus.NOT_FOUND:
+                print(f"Could not retreive user {idx} > {error}")
+            return None
+
         aut = extract_auteur(user_data)
         return aut
 
-    async def search_user_by_name(self, username: str, start: int, priority=1) -> Auteurs:
-        """Retreives a list of all matching usernames, possibly none"""
+    async def search_user_by_name(self, username: str, start: int = 0, priority=1, deadline=None) -> AsyncIterator[Auteurs]:
+        """Yields pages of matching usernames as they arrive, possibly none"""
 
-        params = {
-            'nom' : username,
-            'count': str(start),
-            str(int(time.time())): str(int(time.time())),
-            'lang': self.lang
-            }
+        while True:
+            params = {
+                'nom' : username,
+                'count': str(start),
+                str(int(time.time())): str(int(time.time())),
+                'lang': self.lang
+                }
 
-        users_data = await self.get(f"{api_base_url}{auteurs_path}", params, priority=0)
+            try:
+                users_data = await self.get(f"{api_base_url}{auteurs_path}", params, priority, deadline=deadline)
+            except ApiError as error:
+                if error.status != ApiStatus.NOT_FOUND:
+                    print(f"Could not search users > {error}")
+                break
 
-        if users_data == 404:
-            return []
+            if not users_data:
+                break
 
-        current_users = extract_auteurs_short(users_data)
+            yield extract_auteurs_short(users_data)
 
-        if len(current_users) == 50:
-            return current_users + await self.search_user_by_name(username, start + 50, priority)
+            if not has_next_page(users_data):
+                break
+            start += 50
 
         self.lang = DEFAULT_LANG
-        return current_users
 
 
-    async def fetch_all_challenges(self, start=0) -> list[ChallengeShort]:
-        """Retrieves all challenges given a starting number"""
+    async def fetch_challenges_page(self, start: int, priority: int = 1, ttl: float = CACHE_TTL_CHALLENGES) -> tuple[Challenges, bool]:
+        """Retrieves one page of the challenge listing, and whether there is a next one
+
+        A ttl of 0 revalidates the cached page with its ETag on every call"""
 
         params = {
-            str(int(time.time())): str(int(time.time())),
             'debut_challenges': str(start),
             'lang': DEFAULT_LANG
             }
 
-        current_challenges = []
+        try:
+            challenges_data = await self.get(f"{api_base_url}{challenges_path}/", params, priority, ttl=ttl)
+        except ApiError as error:
+            if error.status != ApiStatus.NOT_FOUND:
+                print(f"Could not retreive challenges from {start} > {error}")
+            return [], False
 
-        if not start:
-            print("Fetching all challenges...")
+        if not isinstance(challenges_data, list) or not challenges_data:
+            #Past the last page
+            return [], False
 
-        challenges_data = await self.get(f"{api_base_url}{challenges_path}/", params)
+        return extract_page_challenges(challenges_data), has_next_page(challenges_data)
 
 
-        #print(challenges_data)
+    async def fetch_all_challenges(self, prefetch: int = CHALLENGES_PREFETCH, expected: int = 0) -> AsyncIterator[Challenges]:
+        """Yields pages of challenges in order as they arrive
 
-        current_challenges += extract_page_challenges(challenges_data)
+        Pages are offsets of CHALLENGES_PAGE_SIZE, the ones covering the expected number of challenges are requested
+        before the current one is back. Past it, a page is only requested once the previous one came back full.
+        A short page or one without a next link cancels the pages after it that are still waiting in the queue."""
 
-        if challenges_data[-1]['rel'] == 'next':
-            return current_challenges + await self.fetch_all_challenges(start=start + (50 - (start % 50)))
-        else:
-            return current_challenges
+        print("Fetching all challenges...")
+
+        pages = deque()
+        start = 0
+        last = None
+
+        def page_done(page_start: int, page: asyncio.Future) -> None:
+            nonlocal last
+            if page.cancelled() or page.exception():
+                return
+            challenges, has_next = page.result()
+            if has_next and len(challenges) >= CHALLENGES_PAGE_SIZE:
+                return
+            if last is None or page_start < last:
+                last = page_start
+            for other_start, other in pages:
+                if other_start > last:
+                    other.cancel()
+
+        try:
+            while True:
+                while len(pages) < prefetch and last is None and (start < expected or not pages):
+                    page = asyncio.ensure_future(self.fetch_challenges_page(start))
+                    page.add_done_callback(functools.partial(page_done, start))
+                    pages.append((start, page))
+                    start += CHALLENGES_PAGE_SIZE
+
+                page_start, page = pages.popleft()
+                challenges, has_next = await page
+                yield challenges
 
-        return current_challenges
+                if page_start == last or not has_next:
+                    break
+        finally:
+            for _, page in pages:
+                page.cancel()
 
 
-    async def get_challenge_by_id(self, idx: int, priority: int) -> Challenge:
-        """Retreives all information about a challenge by ID"""
+    async def get_challenge_by_id(self, idx: int, priority: int, ttl: float = CACHE_TTL_CHALLENGE) -> Challenge:
+        """Retreives all information about a challenge by ID, a ttl of 0 revalidates the cached one"""
 
         params = {
-            str(int(time.time())): str(int(time.time())),
             'lang': DEFAULT_LANG
             }
 
-        challenge_data = await self.get(f"{api_base_url}{challenges_path}/{idx}", params, priority)
+        try:
+            challenge_data = await self.get(f"{api_base_url}{challenges_path}/{idx}", params, priority, ttl=ttl)
+        except ApiError as error:
+            if error.status == ApiStatus.PREMIUM:
+                raise PremiumChallenge(idx)
+            elif error.status == ApiStatus.NOT_FOUND:
+                raise UnknownChallenge(idx)
+            raise
+
         challenge = extract_challenge(challenge_data, idx)
         return challenge
 
-    async def get_image_png(self, idx: int) -> str:
+    async def get_image_png(self, idx: int, priority=0) -> str:
 
-        url = f'https://www.root-me.org/IMG/auton{idx}.png'
+        url = f'{images_base_url}IMG/auton{idx}.png'
 
-        code = await self.head(url, priority=0)
+        code = await self.head(url, priority)
 
-        if code == '200':
+        if code == ApiStatus.OK:
             return url
 
-    async def get_image_jpg(self, idx: int) -> str:
+    async def get_image_jpg(self, idx: int, priority=0) -> str:
 
-        url = f'https://www.root-me.org/IMG/auton{idx}.jpg'
-        code = await self.head(url, priority=0)
+        url = f'{images_base_url}IMG/auton{idx}.jpg'
+        code = await self.head(url, priority)
 
-        if code == '200':
+        if code == ApiStatus.OK:
             return url
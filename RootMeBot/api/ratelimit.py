@@ -0,0 +1,173 @@
+"""Module for the rate limiting engines used by the API worker"""
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from constants import (API_BURST, API_ERROR_DELAY, API_FIXED_DELAY, API_MAX_RATE, API_MIN_RATE,
+                       API_RATE, API_RATE_DECREASE, API_RATE_INCREASE, API_RATE_LIMITER)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header (seconds or HTTP date) into seconds to wait"""
+
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+class RateLimiter(ABC):
+    """Base class for rate limiting engines, the worker calls acquire before each request and reports the outcome"""
+
+    @abstractmethod
+    async def acquire(self) -> None:
+        """Waits until a request can be sent"""
+
+    def success(self) -> None:
+        """Called when the API answered normally"""
+
+    def throttled(self, retry_after: Optional[float] = None) -> None:
+        """Called when the API asked us to slow down (429/503)"""
+
+    def failed(self) -> None:
+        """Called after a network error or an unexpected status"""
+
+    @abstractmethod
+    def current_rate(self) -> float:
+        """Requests per second currently allowed, for estimates"""
+
+
+class FixedDelay(RateLimiter):
+    """Flat delay before every request, and a longer one after an error"""
+
+    def __init__(self, delay: float = API_FIXED_DELAY, error_delay: float = API_ERROR_DELAY) -> None:
+        self.delay = delay
+        self.error_delay = error_delay
+        self.penalty = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            penalty, self.penalty = self.penalty, 0.0
+            await asyncio.sleep(self.delay + penalty)
+
+    def throttled(self, retry_after: Optional[float] = None) -> None:
+        self.penalty = max(self.error_delay, retry_after or 0.0)
+
+    def failed(self) -> None:
+        self.penalty = self.error_delay
+
+    def current_rate(self) -> float:
+        return 1 / self.delay
+
+
+class TokenBucket(RateLimiter):
+    """Token bucket whose rate follows the API: additive increase on success, multiplicative decrease when throttled"""
+
+    def __init__(
+            self,
+            rate: float = API_RATE,
+            burst: int = API_BURST,
+            min_rate: float = API_MIN_RATE,
+            max_rate: float = API_MAX_RATE,
+            increase: float = API_RATE_INCREASE,
+            decrease: float = API_RATE_DECREASE,
+            error_delay: float = API_ERROR_DELAY) -> None:
+
+        self.rate = min(max(rate, min_rate), max_rate)
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.error_delay = error_delay
+
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+
+        self.lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        """Adds the tokens earned since the last refill"""
+        if now > self.last:
+            self.tokens = min(float(self.burst), self.tokens + (now - self.last) * self.rate)
+            self.last = now
+
+    def _block(self, delay: float) -> None:
+        """Stops handing out tokens for some time, without earning any meanwhile"""
+        until = time.monotonic() + delay
+        if until > self.blocked_until:
+            self.blocked_until = until
+        self.tokens = 0.0
+        self.last = self.blocked_until
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def success(self) -> None:
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def throttled(self, retry_after: Optional[float] = None) -> None:
+        now = time.monotonic()
+
+        #Several in-flight requests can be throttled at once, only back off once per interval
+        if now - self.last_decrease >= 1 / self.rate:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.last_decrease = now
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Throttled by the API, rate is now {self.rate:.2f} req/s")
+
+        self._block(retry_after if retry_after is not None else 1 / self.rate)
+
+    def failed(self) -> None:
+        self._block(self.error_delay)
+
+    def current_rate(self) -> float:
+        return self.rate
+
+    def __str__(self) -> str:
+        return f"TokenBucket {self.rate:.2f} req/s (burst {self.burst}, {self.tokens:.1f} tokens)"
+
+
+RATE_LIMITERS = {
+    'token_bucket': TokenBucket,
+    'fixed': FixedDelay,
+}
+
+
+def make_rate_limiter(name: str = API_RATE_LIMITER) -> RateLimiter:
+    """Rate limiter selected by API_RATE_LIMITER"""
+
+    if name not in RATE_LIMITERS:
+        raise ValueError(f"Unknown rate limiter {name}, expected one of {', '.join(RATE_LIMITERS)}")
+    return RATE_LIMITERS[name]()
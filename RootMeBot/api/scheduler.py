@@ -0,0 +1,177 @@
+"""Module for the scheduler of the API requests"""
+import asyncio
+import itertools
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from constants import SCHEDULER_AGING
+
+#Interactive requests, aged entries are promoted up to this class
+TOP_PRIORITY = 0
+
+
+class PriorityEntry(object):
+
+    counter = itertools.count()
+
+    def __init__(self, priority, data, deadline: Optional[float] = None):
+        self.data = data
+        self.priority = priority
+        #time.monotonic() after which the request is not worth sending anymore
+        self.deadline = deadline
+        self.enqueued = time.monotonic()
+        self.seq = next(PriorityEntry.counter)
+        #Expires the entry at its deadline while it waits
+        self.timer = None
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def expired(self, now: float) -> bool:
+        return self.deadline is not None and now > self.deadline
+
+
+class RequestScheduler():
+    """Class that orders requests by priority, FIFO within a priority
+
+    Waiting entries are promoted one class every `aging` seconds so background work can't starve,
+    up to the top class, where entries that were queued there win the ties so interactive requests aren't starved in turn,
+    and entries are dropped at their deadline wherever they are in the queue, instead of being sent."""
+
+    def __init__(self, aging: float = SCHEDULER_AGING, on_expired: Callable[[PriorityEntry], None] = None) -> None:
+        self.aging = aging
+        self.on_expired = on_expired
+
+        self.classes = {}
+        self.event = asyncio.Event()
+
+        self.served = {}
+        self.dropped = 0
+
+    def qsize(self) -> int:
+        return sum(len(entries) for entries in self.classes.values())
+
+    def put_nowait(self, entry: PriorityEntry) -> None:
+        self.classes.setdefault(entry.priority, deque()).append(entry)
+        self.arm(entry)
+        self.event.set()
+
+    async def put(self, entry: PriorityEntry) -> None:
+        self.put_nowait(entry)
+
+    def arm(self, entry: PriorityEntry) -> None:
+        """Schedules the expiry of an entry at its deadline, replacing the previous one"""
+        if entry.timer:
+            entry.timer.cancel()
+            entry.timer = None
+        if entry.deadline is not None:
+            entry.timer = asyncio.get_running_loop().call_later(max(0.0, entry.deadline - time.monotonic()), self.expire_waiting, entry)
+
+    def set_deadline(self, entry: PriorityEntry, deadline: Optional[float]) -> None:
+        entry.deadline = deadline
+        self.arm(entry)
+
+    def _take(self, entry: PriorityEntry) -> bool:
+        try:
+            self.classes.get(entry.priority, deque()).remove(entry)
+        except ValueError:
+            return False
+        return True
+
+    def remove(self, entry: PriorityEntry) -> bool:
+        """Removes a waiting entry, returns False if it was already handed to a worker"""
+        if entry.timer:
+            entry.timer.cancel()
+            entry.timer = None
+        return self._take(entry)
+
+    def reprioritize(self, entry: PriorityEntry, priority) -> None:
+        """Moves a waiting entry to another class, keeping its place in the arrival order"""
+        if priority == entry.priority or not self._take(entry):
+            return
+
+        entry.priority = priority
+        entries = self.classes.setdefault(priority, deque())
+        position = next((i for i, other in enumerate(entries) if other.seq > entry.seq), len(entries))
+        entries.insert(position, entry)
+        self.event.set()
+
+    def effective_priority(self, entry: PriorityEntry, now: float) -> float:
+        return max(TOP_PRIORITY, entry.priority - (now - entry.enqueued) // self.aging)
+
+    def rank(self, entry: PriorityEntry, now: float) -> tuple:
+        """Sort key of an entry, aged entries come after the ones native to the class they reached"""
+        return (self.effective_priority(entry, now), entry.priority, entry.enqueued)
+
+    def expire(self, entry: PriorityEntry) -> None:
+        """Drops an entry whose deadline has passed"""
+        entry.timer = None
+        self.dropped += 1
+        if self.on_expired:
+            self.on_expired(entry)
+
+    def expire_waiting(self, entry: PriorityEntry) -> None:
+        """Timer callback, the entry may have been handed to a worker since"""
+        if self._take(entry):
+            self.expire(entry)
+
+    def pop(self) -> Optional[PriorityEntry]:
+        """Takes the best entry, None if there is nothing to do"""
+
+        now = time.monotonic()
+        best = None
+
+        for entries in self.classes.values():
+            while entries and entries[0].expired(now):
+                self.expire(entries.popleft())
+
+            if not entries:
+                continue
+
+            head = entries[0]
+            if not best or self.rank(head, now) < self.rank(best, now):
+                best = head
+
+        if best:
+            self.classes[best.priority].popleft()
+            if best.timer:
+                best.timer.cancel()
+                best.timer = None
+
+            count, total = self.served.get(best.priority, (0, 0.0))
+            self.served[best.priority] = (count + 1, total + now - best.enqueued)
+
+        return best
+
+    async def get(self) -> PriorityEntry:
+        while True:
+            if entry := self.pop():
+                return entry
+            self.event.clear()
+            await self.event.wait()
+
+    def task_done(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        """Depth, oldest wait and average wait of each priority class"""
+
+        now = time.monotonic()
+        stats = {}
+        for priority in sorted(set(self.classes) | set(self.served)):
+            entries = self.classes.get(priority, ())
+            count, total = self.served.get(priority, (0, 0.0))
+            stats[priority] = {
+                'depth': len(entries),
+                'oldest': now - entries[0].enqueued if entries else 0.0,
+                'average_wait': total / count if count else 0.0
+                }
+        return stats
+
+    def __str__(self) -> str:
+        classes = ', '.join(
+            f"P{priority} {s['depth']} queued (oldest {s['oldest']:.1f}s, avg wait {s['average_wait']:.1f}s)"
+            for priority, s in self.stats().items()
+        )
+        return f"Queue : {classes or 'empty'} - {self.dropped} expired"
@@ -0,0 +1,59 @@
+"""Module that resolves and caches the profile pictures of users"""
+import asyncio
+from datetime import datetime, timedelta
+
+from api.fetch import ApiRootMe
+from constants import AVATAR_TTL, AVATAR_MISSING_TTL, DEFAULT_AVATAR
+
+from database.executor import DatabaseExecutor
+from database.models.avatar_model import Avatar
+
+
+class AvatarManager():
+    """Class that serves profile pictures from the database and refreshes them in the background"""
+
+    def __init__(self, rootme_api: ApiRootMe, db: DatabaseExecutor) -> None:
+        self.rootme_api = rootme_api
+        self.db = db
+        self.refreshing = {}
+
+    async def resolve(self, idx: int, priority=0) -> str:
+        """Asks the API for both extensions at once, returns None if the user has no avatar"""
+
+        png, jpg = await asyncio.gather(
+            self.rootme_api.get_image_png(idx, priority),
+            self.rootme_api.get_image_jpg(idx, priority)
+        )
+        url = png or jpg
+
+        ttl = AVATAR_TTL if url else AVATAR_MISSING_TTL
+        avatar = Avatar(auteur_id=idx, url=url, expires=datetime.now() + timedelta(seconds=ttl))
+        await self.db.run(lambda session: session.merge(avatar))
+
+        return url
+
+    def refresh_in_background(self, idx: int) -> None:
+        """Schedules a low priority resolution, unless one is already running"""
+
+        if idx in self.refreshing:
+            return
+
+        task = asyncio.create_task(self.resolve(idx, priority=1))
+        self.refreshing[idx] = task
+        task.add_done_callback(lambda _: self.refreshing.pop(idx, None))
+
+    async def get_avatar(self, idx: int) -> str:
+        """Returns the avatar url of a user, from the database whenever possible"""
+
+        avatar = await self.db.run(lambda session: session.query(Avatar).filter(Avatar.auteur_id == idx).one_or_none())
+
+        if avatar:
+            if avatar.expires < datetime.now():
+                self.refresh_in_background(idx)
+            url = avatar.url
+        elif idx in self.refreshing:
+            url = await asyncio.shield(self.refreshing[idx])
+        else:
+            url = await self.resolve(idx)
+
+        return url or DEFAULT_AVATAR
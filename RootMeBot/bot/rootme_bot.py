@@ -4,7 +4,7 @@ import asyncio
 import discord
 import utils.messages as utils
 from classes.error import *
-from constants import BOT_PREFIX
+from constants import BOOTSTRAP_PROGRESS_INTERVAL, BOT_PREFIX, CATALOG_SYNC_INTERVAL, POLLING_ERROR_DELAY
 from database.manager import DatabaseManager
 from discord import Embed
 from discord.ext import commands
@@ -52,11 +52,14 @@ class RootMeBot():
         channel = self.bot.get_channel(self.BOT_CHANNEL)
 
         await self.database_manager.create_scoreboard('global')
-        print('Nombre chall',self.database_manager.count_challenges())
-        if self.database_manager.count_challenges() < 450:
-
-            await utils.init_start(channel)
-            await self.database_manager.update_challenges(init=True)
+        if await self.database_manager.needs_bootstrap():
+
+            message = await utils.init_start(channel)
+            bootstrap = asyncio.create_task(self.database_manager.bootstrap_challenges())
+            while not bootstrap.done():
+                await asyncio.wait([bootstrap], timeout=BOOTSTRAP_PROGRESS_INTERVAL)
+                await utils.init_progress(message, *self.database_manager.bootstrap_progress())
+            await bootstrap
             await utils.init_end(channel)
 
         print("Init DB done")
@@ -75,9 +78,9 @@ class RootMeBot():
 
         while True:
 
-            for aut, chall, score_above, is_blood in self.notification_manager.get_solve_queue():
+            for aut, chall, score_above, is_blood, date in self.notification_manager.get_solve_queue():
                 if chall:
-                    await utils.send_new_solve(channel, chall, aut, score_above, is_blood)
+                    await utils.send_new_solve(channel, chall, aut, score_above, is_blood, date)
 
 
             for chall in self.notification_manager.get_chall_queue():
@@ -93,12 +96,12 @@ class RootMeBot():
         while not self.init_done:
             await asyncio.sleep(1)
 
-        #while True:
+        print("OK challs")
 
-            #await self.database_manager.update_challenges()
-            #await asyncio.sleep(3600)
+        while True:
 
-        print("OK challs")
+            await self.database_manager.sync_challenges()
+            await asyncio.sleep(CATALOG_SYNC_INTERVAL)
 
 
     async def cron_check_solves(self) -> None:
@@ -111,7 +114,11 @@ class RootMeBot():
         print("OK solves")
 
         while True:
-            await self.database_manager.update_users()
+            try:
+                await self.database_manager.update_users()
+            except Exception as error:
+                print(f"Polling cycle failed : {error!r}")
+                await asyncio.sleep(POLLING_ERROR_DELAY)
 
     def catch(self):
         """Catch discord event"""
@@ -324,18 +331,14 @@ class RootMeBot():
                     auteur = auteurs[0]
 
 
-            image_profile = await self.database_manager.rootme_api.get_image_png(auteur.idx)
-
-            if not image_profile:
-                image_profile = await self.database_manager.rootme_api.get_image_jpg(auteur.idx)
-            if not image_profile:
-                image_profile = 'https://www.root-me.org/IMG/auton0.png'
+            image_profile = await self.database_manager.avatar_manager.get_avatar(auteur.idx)
 
             stats_glob = await self.database_manager.get_stats()
             stats_auteur = await self.database_manager.get_stats_auteur(auteur)
+            gains = await self.database_manager.get_gains(auteur.idx)
             data = (auteur.username, auteur.score, auteur.rank)
 
-            await utils.profile(context.message.channel, data, stats_auteur, stats_glob, image_profile)
+            await utils.profile(context.message.channel, data, stats_auteur, stats_glob, image_profile, gains)
 
 
 
@@ -396,22 +399,19 @@ class RootMeBot():
                 chall = await self.database_manager.get_challenge_from_db(search_id)
 
                 if chall:
-                    await utils.who_solved(context.message.channel, chall, self.database_manager.session_maker)
+                    await utils.who_solved(context.message.channel, chall, await self.database_manager.get_solvers(chall.idx))
                 else:
                     await utils.cant_find_challenge(context.message.channel, search)
 
             except ValueError:
                 #Search by name
                 results = await self.database_manager.search_challenge_from_db(search)
-                if len(results) > 25:
-                    await utils.many_challenges(context.message.channel, results)
-
-                elif len(results) > 1:
-                    await utils.multiple_challenges(context.message.channel, results, self.database_manager.session_maker)
+                if len(results) > 1:
+                    await utils.multiple_challenges(context.message.channel, results, self.database_manager)
 
                 elif len(results) == 1:
                     chall = results[0]
-                    await utils.who_solved(context.message.channel, chall, self.database_manager.session_maker)
+                    await utils.who_solved(context.message.channel, chall, await self.database_manager.get_solvers(chall.idx))
 
                 else:
                     await utils.cant_find_challenge(context.message.channel, search)
@@ -429,7 +429,7 @@ class RootMeBot():
 
             self.bot.loop.create_task(self.init_db())
 
-            self.worker = self.bot.loop.create_task(self.database_manager.rootme_api.worker())
+            self.workers = self.database_manager.rootme_api.start_workers()
             self.check_solves = self.bot.loop.create_task(self.cron_check_solves())
             self.check_challs = self.bot.loop.create_task(self.cron_check_challs())
 
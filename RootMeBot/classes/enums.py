@@ -24,5 +24,26 @@ class Stats(Enum):
     FORENSICS = 9
     APP_SYSTEM = 10
 
+#Category names used by Root-Me
+CATEGORY_STATS = {
+    'Web - Client': Stats.WEB_CLIENT,
+    'Web - Serveur': Stats.WEB_SERVER,
+    'App - Script': Stats.APP_SCRIPT,
+    'Cryptanalyse': Stats.CRYPTANALYSIS,
+    'Programmation': Stats.PROGRAMMING,
+    'Stéganographie': Stats.STEGANOGRAPHY,
+    'Cracking': Stats.CRACKING,
+    'Réaliste': Stats.REALIST,
+    'Réseau': Stats.NETWORK,
+    'Forensic': Stats.FORENSICS,
+    'App - Système': Stats.APP_SYSTEM,
+}
 
+### API ####
 
+class ApiStatus(Enum):
+    OK = 200
+    NOT_MODIFIED = 304
+    PREMIUM = 401
+    NOT_FOUND = 404
+    EXPIRED = 408
@@ -21,6 +21,25 @@ class UnknownUser(Exception):
 		return f"Error unknown username : {self.username}"
 
 
+class RequestExpired(Exception):
+	"""Exception raised when a request could not be sent before its deadline"""
+	def __init__(self, url) -> None:
+		self.url = url
+	def __str__(self) -> str:
+		return f"Request expired : {self.url}"
+
+
+class ApiError(Exception):
+	"""Exception raised when the API answers without a usable body, the status is None for an undecodable one"""
+	def __init__(self, url, status) -> None:
+		self.url = url
+		self.status = status
+	def __str__(self) -> str:
+		if self.status is None:
+			return f"Invalid response : {self.url}"
+		return f"Error {self.status.value} : {self.url}"
+
+
 class Banned(Exception):
 	"""Exception raised when banned"""
 	def __init__(self, time) -> None:
@@ -6,8 +6,10 @@ from discord.utils import escape_markdown
 import asyncio
 
 from html import unescape
+from math import ceil
+
+from constants import SCOREBOARD_PAGE_SIZE
 
-from database.models.scoreboard_model import Scoreboard
 from database.models.auteur_model import Auteur
 from database.models.challenge_model import Challenge
 
@@ -18,15 +20,15 @@ import utils.messages as utils
 
 class ManageButton(discord.ui.Button):
     """Button to choose which scoreboard"""
-    def __init__(self, sc: Scoreboard, y: int, status: bool):
+    def __init__(self, sc: str, y: int, status: bool):
         self.sc = sc
         
-        if sc.name == 'global':
-            super().__init__(style=discord.ButtonStyle.success, label=sc.name, row=y, disabled=True)
+        if sc == 'global':
+            super().__init__(style=discord.ButtonStyle.success, label=sc, row=y, disabled=True)
         elif status:
-            super().__init__(style=discord.ButtonStyle.success, label=sc.name, row=y)
+            super().__init__(style=discord.ButtonStyle.success, label=sc, row=y)
         else:
-            super().__init__(style=discord.ButtonStyle.secondary, label=sc.name, row=y)
+            super().__init__(style=discord.ButtonStyle.secondary, label=sc, row=y)
 
 
     async def callback(self, interaction: discord.Interaction):
@@ -48,31 +50,29 @@ class ManageButton(discord.ui.Button):
 
 class ManageView(discord.ui.View):
     """View to manage scoreboards"""
-    def __init__(self, db_manager: DatabaseManager, auteur: Auteur):
+    def __init__(self, db_manager: DatabaseManager, auteur: Auteur, scoreboards: list[str], member_of: set[str]):
         super().__init__()
         self.database_manager = db_manager
         self.auteur = auteur
 
-        scoreboards = self.database_manager.get_all_scoreboards()
-
         for idx, sc in enumerate(scoreboards):
             #maximum 5 buttons per row
-            self.add_item(ManageButton(sc, idx // 5, sc.name in [i.name for i in self.auteur.scoreboards]))
+            self.add_item(ManageButton(sc, idx // 5, sc in member_of))
 
-    async def add_to_sc(self, scoreboard: Scoreboard):
-        return await self.database_manager.add_to_scoreboard(self.auteur.idx, scoreboard.name)
+    async def add_to_sc(self, scoreboard: str):
+        return await self.database_manager.add_to_scoreboard(self.auteur.idx, scoreboard)
 
-    async def remove_from_sc(self, scoreboard: Scoreboard):
-        return await self.database_manager.remove_from_scoreboard(self.auteur.idx, scoreboard.name)
+    async def remove_from_sc(self, scoreboard: str):
+        return await self.database_manager.remove_from_scoreboard(self.auteur.idx, scoreboard)
 
 
 
 class DropdownScoreboard(discord.ui.Select):
     """Dropdown to chosse which scoreboard"""
-    def __init__(self, scoreboards: list[Scoreboard]):
+    def __init__(self, scoreboards: list[str]):
 
         options = [
-            discord.SelectOption(label=escape_markdown(i.name), description='') for i in scoreboards
+            discord.SelectOption(label=escape_markdown(i), description='') for i in scoreboards
         ]
 
         super().__init__(placeholder='Choose the scoreboard', min_values=1, max_values=1, options=options)
@@ -81,19 +81,59 @@ class DropdownScoreboard(discord.ui.Select):
         await self.view.show_scoreboard(self.values[0])
 
 class ScoreboardView(discord.ui.View):
-    def __init__(self, channel: TextChannel, db_manager: DatabaseManager):
+    def __init__(self, channel: TextChannel, db_manager: DatabaseManager, scoreboards: list[str]):
         super().__init__()
         self.database_manager = db_manager
         self.channel = channel
 
-        scoreboards = self.database_manager.get_all_scoreboards()
-        
         self.add_item(DropdownScoreboard(scoreboards))
 
     async def show_scoreboard(self, name: str):
         await utils.scoreboard(self.channel, self.database_manager, name)
 
 
+class ScoreboardPageButton(discord.ui.Button):
+    """Button to go to the previous or next page of a scoreboard"""
+    def __init__(self, label: str, step: int):
+        self.step = step
+        super().__init__(style=discord.ButtonStyle.secondary, label=label)
+
+    async def callback(self, interaction: discord.Interaction):
+        assert self.view is not None
+        await self.view.show_page(interaction, self.view.page + self.step)
+
+class ScoreboardPageView(discord.ui.View):
+    """View that fetches the pages of a scoreboard on demand"""
+    def __init__(self, db_manager: DatabaseManager, name: str, total: int):
+        super().__init__()
+        self.database_manager = db_manager
+        self.name = name
+        self.page = 0
+        self.pages = max(1, ceil(total / SCOREBOARD_PAGE_SIZE))
+
+        self.previous = ScoreboardPageButton('Previous', -1)
+        self.next = ScoreboardPageButton('Next', 1)
+        self.add_item(self.previous)
+        self.add_item(self.next)
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous.disabled = self.page <= 0
+        self.next.disabled = self.page >= self.pages - 1
+
+    async def show_page(self, interaction: discord.Interaction, page: int):
+        rows, total = await self.database_manager.get_scoreboard_page(self.name, page)
+
+        #Members may have been added or removed since the previous page
+        self.pages = max(1, ceil(total / SCOREBOARD_PAGE_SIZE))
+        self.page = min(page, self.pages - 1)
+        if self.page != page:
+            rows, total = await self.database_manager.get_scoreboard_page(self.name, self.page)
+        self.update_buttons()
+
+        await interaction.response.edit_message(embed=utils.scoreboard_page(self.name, rows, self.page, self.pages), view=self)
+
+
 class MultipleChallButton(discord.ui.Select):
     def __init__(self, challenges: list[Challenge]):
 
@@ -107,9 +147,9 @@ class MultipleChallButton(discord.ui.Select):
         await self.view.show_challenge(self.values[0])
 
 class MultipleChallFoundView(discord.ui.View):
-    def __init__(self, channel: TextChannel, challenges: list[Challenge], Session):
+    def __init__(self, channel: TextChannel, challenges: list[Challenge], db_manager: DatabaseManager):
         super().__init__()
-        self.Session = Session
+        self.database_manager = db_manager
         self.channel = channel
         self.challenges = challenges
 
@@ -117,7 +157,7 @@ class MultipleChallFoundView(discord.ui.View):
 
     async def show_challenge(self, idx: str):
         chall = next(filter(lambda x: x.idx == int(idx), self.challenges))
-        await utils.who_solved(self.channel, chall, self.Session)
+        await utils.who_solved(self.channel, chall, await self.database_manager.get_solvers(chall.idx))
 
 class MultipleUserButton(discord.ui.Select):
     def __init__(self, users: list[Auteur]):
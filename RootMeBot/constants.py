@@ -7,20 +7,127 @@ cookies_rootme = { "api_key": f"{API_KEY}" }
 
 ### API PATH ####
 
-api_base_url = "https://api.www.root-me.org/"
+# Can be pointed at the stand-in server from mock/server.py
+api_base_url = getenv("API_BASE_URL", "https://api.www.root-me.org/")
+images_base_url = getenv("IMAGES_BASE_URL", "https://www.root-me.org/")
 challenges_path = "challenges"
 auteurs_path = "auteurs"
 
+### API RATE LIMIT ###
+
+# Requests per second at startup, the rate then adapts to what the API allows
+API_RATE = float(getenv("API_RATE", 1 / 4.5))
+API_MIN_RATE = float(getenv("API_MIN_RATE", 1 / 30))
+API_MAX_RATE = float(getenv("API_MAX_RATE", 1))
+API_BURST = int(getenv("API_BURST", 3))
+
+# AIMD: added to the rate after each success, rate multiplied when throttled
+API_RATE_INCREASE = float(getenv("API_RATE_INCREASE", 0.01))
+API_RATE_DECREASE = float(getenv("API_RATE_DECREASE", 0.5))
+
+# Pause after a network error or an unexpected status
+API_ERROR_DELAY = 15
+
+# 'token_bucket' adapts to the API, 'fixed' waits API_FIXED_DELAY seconds before every request
+API_RATE_LIMITER = getenv("API_RATE_LIMITER", "token_bucket")
+API_FIXED_DELAY = float(getenv("API_FIXED_DELAY", 4.5))
+
+### API WORKERS ###
+
+# Workers draining the request queue, all sharing the rate limit above
+API_WORKERS = int(getenv("API_WORKERS", 4))
+API_MAX_CONNECTIONS = 24
+
+# Seconds allowed for each HTTP attempt, big auteur payloads can be slow
+API_TIMEOUT = 30
+API_HEAD_TIMEOUT = 10
+
+# Seconds after which a waiting request is promoted one priority class
+SCHEDULER_AGING = 30
+
+# Interactive lookups are dropped if they can't be sent within this many seconds
+INTERACTIVE_DEADLINE = 60
+
+### API CACHE ###
+
+# Challenge endpoints are cached on disk, other endpoints are always fetched
+CACHE_PATH = getenv("CACHE_PATH", "/opt/db/http_cache.db")
+CACHE_TTL_CHALLENGE = 7 * 24 * 3600
+CACHE_TTL_CHALLENGES = 6 * 3600
+# Expired responses are kept this long for revalidation, then deleted
+CACHE_RETENTION = 30 * 24 * 3600
+CACHE_EVICT_INTERVAL = 3600
+
+### API PAGINATION ###
+
+# Pages of the challenge listing requested ahead of the one being processed
+CHALLENGES_PREFETCH = 4
+CHALLENGES_PAGE_SIZE = 50
+
+# Premium or unknown challenges are requested again after this many seconds
+UNAVAILABLE_RECHECK = 7 * 24 * 3600
+
+### BOOTSTRAP ###
+
+# The first run fills the database when it has fewer challenges than this
+BOOTSTRAP_MIN_CHALLENGES = 450
+# Seconds between two edits of the progress message
+BOOTSTRAP_PROGRESS_INTERVAL = 15
+
+### CATALOG SYNC ###
+
+# Seconds between two syncs of the challenge listing
+CATALOG_SYNC_INTERVAL = 3600
+# Requests allowed per sync, listing pages and new challenges together
+CATALOG_SYNC_BUDGET = 30
+# Background class of the request scheduler, behind solves and commands
+CATALOG_PRIORITY = 2
+
 ### API LANG ####
 
 DEFAULT_LANG = "fr"
 
 ### DATABASE ####
 
-database_path = "/opt/db/rootme.db"
+database_path = getenv("DATABASE_PATH", "/opt/db/rootme.db")
 LOG_PATH = "/opt/db/log.txt"
 
+# SQLite profile set on every connection, cache_size is negative to be in KiB
+DB_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Results of a search in the database, embeds and select menus hold 25 items
+SEARCH_LIMIT = 25
+
+# Database work runs in a dedicated thread so a locked database can't freeze the event loop, 0 runs it inline
+DB_THREAD = getenv("DB_THREAD", "1") != "0"
+# Transactions waiting for the database thread before callers have to wait their turn
+DB_QUEUE_SIZE = 64
+
+### SCORE HISTORY ###
+
+# Samples younger than this are kept hourly, older ones daily
+HISTORY_HOURLY_DAYS = 30
+# Seconds between two downsamplings of the history
+HISTORY_COMPACT_INTERVAL = 3600
+
+### AVATARS ###
+
+DEFAULT_AVATAR = f"{images_base_url}IMG/auton0.png"
+AVATAR_TTL = 7 * 24 * 3600
+AVATAR_MISSING_TTL = 24 * 3600
+
 ### BOT CONSTANTS ###
 
 PING_ROLE_ROOTME = getenv("PING_ROLE_ROOTME")
 BOT_PREFIX = "!"
+
+# Users per page of a scoreboard, an embed description holds 4096 characters
+SCOREBOARD_PAGE_SIZE = 20
+# Seconds before polling again after a failed cycle
+POLLING_ERROR_DELAY = 60
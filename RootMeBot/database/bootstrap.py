@@ -0,0 +1,31 @@
+"""Module for the work queue of the first run
+
+The queue is written once the whole listing is known, then each challenge is marked done once stored,
+so a restarted bootstrap skips the listing and only fetches the pending challenges."""
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database.models.bootstrap_model import BootstrapChallenge
+
+
+def enqueue(session, ids: list[int]) -> None:
+    if ids:
+        session.execute(sqlite_insert(BootstrapChallenge).on_conflict_do_nothing(), [{'idx': idx} for idx in ids])
+
+
+def progress(session) -> tuple[int, int]:
+    """(done, total) of the queue, (0, 0) when no bootstrap is running"""
+    done, total = session.query(func.count().filter(BootstrapChallenge.done), func.count()).one()
+    return done, total
+
+
+def pending(session) -> list[int]:
+    return [row[0] for row in session.query(BootstrapChallenge.idx).filter(~BootstrapChallenge.done).order_by(BootstrapChallenge.idx)]
+
+
+def mark_done(session, idx: int) -> None:
+    session.query(BootstrapChallenge).filter(BootstrapChallenge.idx == idx).update({BootstrapChallenge.done: True}, synchronize_session=False)
+
+
+def clear(session) -> None:
+    session.query(BootstrapChallenge).delete(synchronize_session=False)
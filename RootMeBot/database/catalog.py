@@ -0,0 +1,45 @@
+"""Module for the checkpoints of the incremental challenge listing sync
+
+A page is only diffed against the database when its hash changed since the last run. New challenges show
+up on the last pages, so the sync starts from the last known page, then revisits the least recently checked ones."""
+import hashlib
+from datetime import datetime
+
+from classes.challenge import ChallengeShort
+
+from database.models.catalog_model import CatalogPage
+
+
+def page_hash(challenges: list[ChallengeShort]) -> str:
+    digest = hashlib.sha1()
+    for chall in sorted(challenges, key=lambda chall: chall.idx):
+        digest.update(f'{chall.idx}:{chall.title}\n'.encode())
+    return digest.hexdigest()
+
+
+def load(session) -> dict[int, CatalogPage]:
+    return {page.start: page for page in session.query(CatalogPage)}
+
+
+def highest_id(pages: dict[int, CatalogPage]) -> int:
+    """Highest challenge id seen in the listing, newer ones are new challenges"""
+    return max((page.max_id for page in pages.values()), default=0)
+
+
+def visit_order(pages: dict[int, CatalogPage], tail: int) -> list[int]:
+    """Known pages other than the tail, the least recently checked first"""
+    others = [page for start, page in pages.items() if start < tail]
+    return [page.start for page in sorted(others, key=lambda page: page.checked)]
+
+
+def checkpoint(session, start: int, challenges: list[ChallengeShort], digest: str, now: datetime) -> None:
+    session.merge(CatalogPage(start=start, hash=digest, max_id=max(chall.idx for chall in challenges), checked=now))
+
+
+def touch(session, start: int, now: datetime) -> None:
+    session.query(CatalogPage).filter(CatalogPage.start == start).update({CatalogPage.checked: now}, synchronize_session=False)
+
+
+def truncate(session, end: int) -> None:
+    """Forgets pages past the end of the listing"""
+    session.query(CatalogPage).filter(CatalogPage.start >= end).delete(synchronize_session=False)
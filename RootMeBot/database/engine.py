@@ -0,0 +1,26 @@
+"""Module that creates the SQLite engine with its storage profile"""
+from constants import DB_PRAGMAS
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+from database.search import fold
+
+
+def make_engine(path: str, pragmas: dict = DB_PRAGMAS) -> Engine:
+    """Engine on the SQLite file at path, every new connection gets the pragmas and the fold() function
+
+    WAL lets the bot read while the polling cycle writes, and with synchronous=NORMAL
+    a commit doesn't wait for the disk, a crash can only lose the latest transactions."""
+
+    engine = create_engine(f"sqlite:///{path}", connect_args={'timeout': 15})
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(connection, _) -> None:
+        cursor = connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+        #Used by the triggers of the search index
+        connection.create_function('fold', 1, fold, deterministic=True)
+
+    return engine
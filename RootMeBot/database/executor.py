@@ -0,0 +1,67 @@
+"""Module that runs the database work out of the event loop"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from constants import DB_QUEUE_SIZE, DB_THREAD
+from sqlalchemy.orm import sessionmaker
+
+
+class DatabaseExecutor():
+    """Class that runs transactions one at a time in a dedicated thread
+
+    SQLite only has one writer anyway, a single thread avoids waiting on our own locks.
+    At most `queue_size` transactions are waiting for the thread, other callers wait in the event loop."""
+
+    def __init__(self, session_maker: sessionmaker, threaded: bool = DB_THREAD, queue_size: int = DB_QUEUE_SIZE) -> None:
+        self.session_maker = session_maker
+        self.threaded = threaded
+        self.queue_size = queue_size
+
+        self.thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='database') if threaded else None
+        #Created on first use, to be bound to the running loop
+        self.slots = None
+
+        self.transactions = 0
+        self.busy = 0.0
+        self.waiting = 0
+        self.max_waiting = 0
+
+    def transaction(self, func: Callable[..., Any], *args) -> Any:
+        """Calls func(session, *args) in a transaction, committed if it returns"""
+
+        start = time.monotonic()
+        try:
+            with self.session_maker.begin() as session: # type: ignore
+                return func(session, *args)
+        finally:
+            self.transactions += 1
+            self.busy += time.monotonic() - start
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """Runs func(session, *args) in a transaction without blocking the event loop"""
+
+        if not self.threaded:
+            return self.transaction(func, *args)
+
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.queue_size)
+
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            async with self.slots:
+                return await asyncio.get_running_loop().run_in_executor(self.thread, self.transaction, func, *args)
+        finally:
+            self.waiting -= 1
+
+    def close(self) -> None:
+        if self.thread:
+            self.thread.shutdown(wait=True)
+
+    def __str__(self) -> str:
+        mode = 'thread' if self.threaded else 'inline'
+        average = 1000 * self.busy / self.transactions if self.transactions else 0.0
+        return f"Database ({mode}) : {self.transactions} transactions, avg {average:.1f}ms, {self.waiting} waiting (max {self.max_waiting})"
+
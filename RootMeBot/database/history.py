@@ -0,0 +1,91 @@
+"""Module for the score and rank history of users
+
+A sample holds the score and rank of a user from its timestamp until the next sample, so samples are
+only appended on changes. Downsampling keeps the last sample of each hour, and of each day once older
+than HISTORY_HOURLY_DAYS."""
+import time
+from datetime import datetime
+from typing import Optional
+
+from constants import HISTORY_HOURLY_DAYS
+from sqlalchemy import text
+
+from database.models.history_model import ScoreHistory
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+#Deletes the samples followed by another one of the same user in the same bucket
+COMPACT = text(
+    'DELETE FROM score_history WHERE EXISTS ('
+    'SELECT 1 FROM score_history AS later '
+    'WHERE later.auteur_id = score_history.auteur_id '
+    'AND later.timestamp > score_history.timestamp '
+    'AND later.timestamp < (score_history.timestamp / :bucket + 1) * :bucket'
+    ') AND score_history.timestamp >= :start AND score_history.timestamp < :end'
+)
+
+
+def parse_rank(rank) -> Optional[int]:
+    """Ranks are text on Auteur, empty for users without points"""
+    rank = str(rank or '')
+    return int(rank) if rank.isdigit() else None
+
+
+def record(session, idx: int, score: int, rank, when: Optional[float] = None) -> bool:
+    """Appends a sample if the score or rank of the user changed since the latest one"""
+
+    rank = parse_rank(rank)
+    latest = session.query(ScoreHistory.score, ScoreHistory.rank) \
+        .filter(ScoreHistory.auteur_id == idx) \
+        .order_by(ScoreHistory.timestamp.desc()) \
+        .first()
+
+    if latest and tuple(latest) == (score, rank):
+        return False
+
+    session.merge(ScoreHistory(auteur_id=idx, timestamp=int(when or time.time()), score=score, rank=rank))
+    return True
+
+
+def forget(session, idx: int) -> None:
+    session.query(ScoreHistory).filter(ScoreHistory.auteur_id == idx).delete(synchronize_session=False)
+
+
+def compact(session, now: Optional[float] = None) -> int:
+    """Downsamples the history, returns the number of samples deleted"""
+
+    now = int(now or time.time())
+    cutoff = now - HISTORY_HOURLY_DAYS * DAY
+
+    deleted = session.execute(COMPACT, {'bucket': DAY, 'start': 0, 'end': cutoff}).rowcount
+    deleted += session.execute(COMPACT, {'bucket': HOUR, 'start': cutoff, 'end': now}).rowcount
+    return deleted
+
+
+def samples(session, idx: int, start: datetime, end: Optional[datetime] = None) -> list[tuple[datetime, int, Optional[int]]]:
+    """(date, score, rank) of a user between start and end, starting with the sample in force at start"""
+
+    start_ts = int(start.timestamp())
+    query = session.query(ScoreHistory.timestamp, ScoreHistory.score, ScoreHistory.rank).filter(ScoreHistory.auteur_id == idx)
+
+    first = query.filter(ScoreHistory.timestamp <= start_ts).order_by(ScoreHistory.timestamp.desc()).first()
+
+    rows = query.filter(ScoreHistory.timestamp > start_ts)
+    if end:
+        rows = rows.filter(ScoreHistory.timestamp <= int(end.timestamp()))
+    rows = rows.order_by(ScoreHistory.timestamp).all()
+
+    if first:
+        rows.insert(0, first)
+
+    return [(datetime.fromtimestamp(timestamp), score, rank) for timestamp, score, rank in rows]
+
+
+def gains(session, idx: int, since: datetime) -> int:
+    """Points earned since a date, counted from the first sample if the user was tracked later"""
+
+    history = samples(session, idx, since)
+    if not history:
+        return 0
+    return history[-1][1] - history[0][1]
@@ -0,0 +1,54 @@
+"""Module for the score ladder, used to find who a user has to overtake next"""
+from bisect import bisect_left, bisect_right
+
+from database.models.auteur_model import Auteur
+
+
+class ScoreLadder():
+    """Class that keeps users sorted by score, to find the one just above a score in O(log n)"""
+
+    def __init__(self, users: list[tuple[int, str, int]] = ()) -> None:
+        #(score, username, idx) sorted, and the scores alone in the same order for bisect
+        self.entries = []
+        self.scores = []
+        self.positions = {}
+
+        for idx, username, score in users:
+            self.update(idx, username, score)
+
+    @classmethod
+    def load(cls, session) -> 'ScoreLadder':
+        """Snapshot of every user in the database"""
+        return cls(session.query(Auteur.idx, Auteur.username, Auteur.score).all())
+
+    def remove(self, idx: int) -> None:
+        if (entry := self.positions.pop(idx, None)) is None:
+            return
+
+        i = bisect_left(self.entries, entry)
+        del self.entries[i]
+        del self.scores[i]
+
+    def update(self, idx: int, username: str, score: int) -> None:
+        """Adds a user or moves it to its new score"""
+        self.remove(idx)
+
+        #A missing username would make the tuples uncomparable for bisect
+        entry = (score or 0, username or '', idx)
+        i = bisect_left(self.entries, entry)
+        self.entries.insert(i, entry)
+        self.scores.insert(i, entry[0])
+        self.positions[idx] = entry
+
+    def above(self, score: int) -> tuple[str, int]:
+        """Username and score of the user with the lowest score strictly greater, ("", 0) for the first one"""
+        i = bisect_right(self.scores, score)
+
+        if i == len(self.entries):
+            return ("", 0)
+
+        score, username, _ = self.entries[i]
+        return (username, score)
+
+    def __len__(self) -> int:
+        return len(self.entries)
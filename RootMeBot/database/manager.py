@@ -1,21 +1,34 @@
 """Module for the DatabaseManager"""
 import asyncio
 import code
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Optional
 
+from api.extract import make_validations
 from api.fetch import ApiRootMe
+from avatar.manager import AvatarManager
 from classes.auteur import AuteurData
 from classes.challenge import ChallengeData
-from classes.enums import Stats
-from classes.error import PremiumChallenge, UnknownUser
-from constants import database_path
+from classes.enums import CATEGORY_STATS, Stats
+from classes.error import ApiError, PremiumChallenge, RequestExpired, UnknownChallenge, UnknownUser
+from constants import BOOTSTRAP_MIN_CHALLENGES, CACHE_TTL_CHALLENGE, CATALOG_PRIORITY, CATALOG_SYNC_BUDGET, CHALLENGES_PAGE_SIZE, HISTORY_COMPACT_INTERVAL, INTERACTIVE_DEADLINE, SCOREBOARD_PAGE_SIZE, SEARCH_LIMIT, UNAVAILABLE_RECHECK, database_path
 from notify.manager import NotificationManager
-from sqlalchemy import create_engine, func
-from sqlalchemy.orm import make_transient, sessionmaker
-
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import sessionmaker
+
+from database import bootstrap, catalog, history, unavailable
+from database.engine import make_engine
+from database.executor import DatabaseExecutor
+from database.ladder import ScoreLadder
+from database.migrations import migrate
+from database.search import search_ids
 from database.models.auteur_model import Auteur
-from database.models.base_model import Base
 from database.models.challenge_model import Challenge
-from database.models.scoreboard_model import Scoreboard
+from database.models.scoreboard_model import Scoreboard, association_table
+from database.models.validation_model import Validation
 
 Solves = list[tuple[AuteurData, ChallengeData]]
 Challenges = list[ChallengeData]
@@ -24,138 +37,290 @@ Auteurs = list[AuteurData]
 class DatabaseManager():
     """Class that manages the database"""
 
-    def __init__(self, rootme_api: ApiRootMe, notification_manager: NotificationManager) -> None:
+    def __init__(self, rootme_api: ApiRootMe, notification_manager: NotificationManager, path: str = database_path) -> None:
 
         self.rootme_api = rootme_api
         self.notification_manager = notification_manager
 
-        self.engine = create_engine(f"sqlite://{database_path}", connect_args={'timeout': 15})
-        Base.metadata.create_all(bind=self.engine)
+        self.engine = make_engine(path)
+        #Searches fall back to LIKE when SQLite is built without FTS5
+        self.search_index = migrate(self.engine)
 
         self.session_maker = sessionmaker(self.engine, expire_on_commit=False)
+        self.db = DatabaseExecutor(self.session_maker)
+
+        self.avatar_manager = AvatarManager(rootme_api, self.db)
+
+        #Who is above who, reloaded every polling cycle and kept up to date in between
+        self.ladder = self.db.transaction(ScoreLadder.load)
+
+        #Challenges per category, reset when challenges are added
+        self.global_stats = None
+
+        #Challenges the API refused, and when
+        self.unavailable = self.db.transaction(unavailable.load)
+
+        #(done, total) challenges of the running bootstrap
+        self.bootstrap_state = [0, 0]
+
+        #time.monotonic() of the latest downsampling of the score history
+        self.history_compacted = 0.0
 
-    def count_challenges(self) -> int:
+        #Per user count of 'skipped' (unchanged) and 'processed' updates
+        self.update_counters = defaultdict(Counter)
+
+    async def count_challenges(self) -> int:
         """Counts number of challenges, used for initialization"""
 
-        with self.session_maker.begin() as session: # type: ignore
-            res = session.query(Challenge.idx).count()
+        return await self.db.run(lambda session: session.query(Challenge.idx).count())
 
-        return res
+    def is_unavailable(self, idx: int) -> bool:
+        """Whether the API refused the challenge recently"""
+
+        checked = self.unavailable.get(idx)
+        return checked is not None and datetime.now() - checked < timedelta(seconds=UNAVAILABLE_RECHECK)
+
+    async def get_challenge(self, idx: int, priority: int = 1, ttl: float = CACHE_TTL_CHALLENGE) -> Optional[Challenge]:
+        """Challenge from the api, None if it is premium or unknown, which is remembered"""
+
+        if self.is_unavailable(idx):
+            return None
 
-    async def add_challenge_to_db(self, idx: int, priority=1) -> Challenge:
-        """Adds a Challenge to db from api"""
         try:
-            challenge = await self.rootme_api.get_challenge_by_id(idx, priority)
+            challenge = await self.rootme_api.get_challenge_by_id(idx, priority, ttl)
         except PremiumChallenge:
-            return Challenge()
+            print(f"Could not retreive premium challenge {idx}")
+            reason = 'premium'
+        except UnknownChallenge:
+            print(f"Challenge {idx} doesn't exist")
+            reason = 'unknown'
+        except ApiError as error:
+            #Not remembered, it may be readable on the next try
+            print(f"Could not retreive challenge {idx} > {error}")
+            return None
+        else:
+            if self.unavailable.pop(idx, None):
+                await self.db.run(unavailable.forget, idx)
+            return challenge
+
+        now = datetime.now()
+        self.unavailable[idx] = now
+        await self.db.run(unavailable.remember, idx, reason, now)
+        return None
 
-        return challenge
+    async def add_challenge_to_db(self, idx: int, priority=1) -> Challenge:
+        """Adds a Challenge to db from api"""
+
+        #Validations are stored anyway, without a challenge to point to
+        return await self.get_challenge(idx, priority)
 
     async def get_challenge_from_db(self, idx: int) -> Challenge:
         """Retreives an Challenge from database"""
 
-        with self.session_maker.begin() as session: # type: ignore
-            chall = session.query(Challenge).filter(Challenge.idx == idx).one_or_none()
-        return chall
+        return await self.db.run(lambda session: session.query(Challenge).filter(Challenge.idx == idx).one_or_none())
 
 
-    async def update_challenges(self, init=False) -> None:
-        """Retreives all challenges"""
+    def store_challenge(self, session, full_chall: Challenge) -> None:
+        """Adds a challenge, or updates the one in database in case of an update from Root-Me"""
 
-        print("Updating all challenges...")
+        if stored := session.get(Challenge, full_chall.idx):
+            for key in ('title', 'category', 'description', 'score', 'difficulty', 'date'):
+                setattr(stored, key, getattr(full_chall, key))
+            return
 
-        with self.session_maker.begin() as session: # type: ignore
-            old_challs = session.query(Challenge).all()
-            old_ids = [c.idx for c in old_challs]
-            all_challenges = await self.rootme_api.fetch_all_challenges()
+        session.add(full_chall)
+        #Validations of it may have been stored before it was listed
+        self.update_solver_counts(session, [full_chall.idx])
+        self.global_stats = None
 
-            new_challenges = [new_chall for new_chall in all_challenges if new_chall.idx not in old_ids]
+    async def fetch_challenge(self, idx: int, priority: int = 1, ttl: float = CACHE_TTL_CHALLENGE) -> Optional[Challenge]:
+        """Fetches and stores a challenge, None if it can't be retrieved"""
 
+        if not (full_chall := await self.get_challenge(idx, priority, ttl)):
+            return None
 
-        async def get_new_chall(idx: int):
-            try:
-                full_chall = await self.rootme_api.get_challenge_by_id(idx, 1)
-            except PremiumChallenge:
-                print(f"Could not retreive premium challenge {idx}")
-                return
-
-            with self.session_maker.begin() as session: # type: ignore
-                if temp_chall := session.query(Challenge.idx).filter(Challenge.idx == full_chall.idx).one_or_none():
-                    if temp_chall.score != full_chall.score:
-                        #In case of an update from Root-Me
-                        temp_chall.update(full_chall)
-                else:
-                    session.add(full_chall)
+        await self.db.run(self.store_challenge, full_chall)
+        return full_chall
+
+    async def needs_bootstrap(self) -> bool:
+        """Whether the database seems empty, or a bootstrap was interrupted"""
+
+        if await self.count_challenges() < BOOTSTRAP_MIN_CHALLENGES:
+            return True
+        return (await self.db.run(bootstrap.progress))[1] > 0
+
+    def bootstrap_progress(self) -> tuple[int, int, float]:
+        """(done, total, seconds left) of the running bootstrap, estimated with the current rate limit"""
+
+        done, total = self.bootstrap_state
+        return done, total, (total - done) / self.rootme_api.rate_limiter.current_rate()
+
+    async def bootstrap_challenges(self) -> None:
+        """Retreives all challenges on the first run, resuming the queue of an interrupted one"""
 
-            if not init:
-                self.notification_manager.add_chall_to_queue(full_chall)
+        done, total = await self.db.run(bootstrap.progress)
 
-        await asyncio.gather(*(get_new_chall(chall.idx) for chall in new_challenges))
+        if total:
+            print(f"Resuming the bootstrap : {done}/{total} challenges")
+        else:
+            print("Updating all challenges...")
+            old_ids = await self.db.run(lambda session: {i[0] for i in session.query(Challenge.idx).all()})
+
+            new_ids = []
+            async for page in self.rootme_api.fetch_all_challenges(expected=len(old_ids)):
+                new_ids += [chall.idx for chall in page if chall.idx not in old_ids and not self.is_unavailable(chall.idx)]
+
+            await self.db.run(bootstrap.enqueue, new_ids)
+
+        pending = await self.db.run(bootstrap.pending)
+        total = (await self.db.run(bootstrap.progress))[1]
+        self.bootstrap_state = [total - len(pending), total]
+
+        async def get_new_chall(idx: int):
+            await self.fetch_challenge(idx)
+            await self.db.run(bootstrap.mark_done, idx)
+            self.bootstrap_state[0] += 1
+
+        await asyncio.gather(*[get_new_chall(idx) for idx in pending])
+        await self.db.run(bootstrap.clear)
 
         print("Done updating challenges !")
+        print(self.rootme_api.cache)
+
+    async def sync_challenges(self, budget: int = CATALOG_SYNC_BUDGET) -> None:
+        """Syncs the challenge listing within a budget of requests, resuming where the last sync stopped
+
+        Pages are revalidated with their ETag and only diffed when their hash changed,
+        a page is checkpointed once all of its new or renamed challenges are stored."""
+
+        def load(session):
+            known = dict(session.query(Challenge.idx, Challenge.title))
+            return known, catalog.load(session)
+
+        known, pages = await self.db.run(load)
+        highest = max(catalog.highest_id(pages), max(known, default=0))
+        tail = max(pages, default=0)
+        #New challenges are appended, so the tail is walked first
+        order = [tail]
+        revisit = catalog.visit_order(pages, tail)
+
+        spent = added = changed = 0
+
+        while order and spent < budget:
+            start = order.pop(0)
+            challenges, has_next = await self.rootme_api.fetch_challenges_page(start, CATALOG_PRIORITY, ttl=0)
+            spent += 1
+            now = datetime.now()
 
-        return
+            if not challenges:
+                await self.db.run(catalog.truncate, start)
+            elif (digest := catalog.page_hash(challenges)) == getattr(pages.get(start), 'hash', None):
+                await self.db.run(catalog.touch, start, now)
+            else:
+                stale = [chall for chall in challenges if known.get(chall.idx) != chall.title and not self.is_unavailable(chall.idx)]
+                todo = stale[:budget - spent]
+                spent += len(todo)
+
+                #Revalidated, the cached details would still hold the old title
+                results = await asyncio.gather(*[self.fetch_challenge(chall.idx, CATALOG_PRIORITY, ttl=0) for chall in todo])
+                complete = len(todo) == len(stale)
+                for chall, full_chall in zip(todo, results):
+                    if full_chall is None:
+                        #Refused challenges are done with, other failures are retried
+                        complete = complete and self.is_unavailable(chall.idx)
+                        continue
+                    if full_chall.title != chall.title:
+                        print(f"Challenge {chall.idx} is listed as {chall.title} but stored as {full_chall.title}")
+                        complete = False
+                        continue
+                    if chall.idx not in known and chall.idx > highest:
+                        added += 1
+                        self.notification_manager.add_chall_to_queue(full_chall)
+                    else:
+                        changed += 1
+                    known[chall.idx] = chall.title
+
+                #Unfinished pages are diffed again on the next sync
+                if complete:
+                    await self.db.run(catalog.checkpoint, start, challenges, digest, now)
+
+            if start >= tail:
+                if has_next:
+                    order.insert(0, start + CHALLENGES_PAGE_SIZE)
+                else:
+                    await self.db.run(catalog.truncate, start + CHALLENGES_PAGE_SIZE)
+                    order += revisit
+
+        print(f"Challenges synced : {spent}/{budget} requests, {added} new, {changed} updated")
 
     async def get_all_users_from_db(self) -> list[Auteur]:
         """Returns all users in database in the form of Auteur"""
 
-        with self.session_maker.begin() as session: # type: ignore
-            users = session.query(Auteur).all()
+        return await self.db.run(lambda session: session.query(Auteur).all())
+
+    def search(self, session, model, search_table: str, column, name: str) -> list:
+        """Rows of model matching name, the most relevant first"""
 
-        return users
+        if not self.search_index:
+            return session.query(model).filter(column.contains(name)).limit(SEARCH_LIMIT).all()
+
+        ids = search_ids(session, search_table, name, SEARCH_LIMIT)
+        rows = {row.idx: row for row in session.query(model).filter(model.idx.in_(ids))}
+        return [rows[idx] for idx in ids if idx in rows]
 
     async def search_user_from_db(self, name: str) -> list[Auteur]:
         """Returns a list of users whose username contains the search"""
 
-        with self.session_maker.begin() as session: # type: ignore
-            users = session.query(Auteur).filter(Auteur.username.contains(name)).all()
-
-        return users
+        return await self.db.run(self.search, Auteur, 'search_auteurs', Auteur.username, name)
 
     async def get_user_from_db(self, idx: int) -> Auteur:
         """Retreives an Auteur from database"""
 
-        with self.session_maker.begin() as session: # type: ignore
-            auteur = session.query(Auteur).where(Auteur.idx == idx).one_or_none()
-        return auteur
+        return await self.db.run(lambda session: session.query(Auteur).where(Auteur.idx == idx).one_or_none())
 
     async def remove_user_from_db(self, idx: int) -> AuteurData:
         """Remove an Auteur from db by id"""
-        with self.session_maker.begin() as session: # type: ignore
+
+        def remove(session) -> str:
             aut = session.query(Auteur).filter(Auteur.idx == idx).one_or_none()
             username = aut.username
-            aut.validations = []
+            self.delete_validations(session, idx)
+            history.forget(session, idx)
             session.delete(aut)
+            self.ladder.remove(idx)
             return username
 
+        return await self.db.run(remove)
+
 
     async def search_challenge_from_db(self, name: str) -> list[Challenge]:
         """Retreives a list of matching challenges in the db"""
-        with self.session_maker.begin() as session: # type: ignore
-            challs = session.query(Challenge).filter(Challenge.title.contains(name)).all()
 
-        return challs
+        return await self.db.run(self.search, Challenge, 'search_challenges', Challenge.title, name)
 
 
 
     async def remove_user_from_db_by_name(self, name: str) -> list[str]:
         """Remove an Auteur from db by id"""
-        with self.session_maker.begin() as session: # type: ignore
 
+        def remove(session) -> list[str]:
             aut = session.query(Auteur).filter(Auteur.username == name)
 
             if (v := aut.count()) == 1:
                 auteur = aut.one()
                 username = auteur.username
-                auteur.validations = []
+                self.ladder.remove(auteur.idx)
+                self.delete_validations(session, auteur.idx)
+                history.forget(session, auteur.idx)
                 aut.delete()
                 ret = [username]
             elif v == 0:
                 ret = []
             else:
                 ret = aut.all()
+            return ret
 
-        return ret
+        return await self.db.run(remove)
 
     async def retreive_user(self, idx: int, priority=1) -> Auteur:
         """Returns a Auteur populated properly"""
@@ -165,64 +330,151 @@ class DatabaseManager():
         return auteur
 
 
-    async def update_user(self, idx: int) -> None:
-        """Tries to update a user to database, if it doesn't exist return nothing"""
-        new_vals = []
-        #If the user already exists in our database
+    def has_changed(self, stored: tuple, count: int, auteur: Auteur) -> bool:
+        """Compares the score, rank and number of validations of a fetched Auteur with the stored ones"""
+        return (stored.score, str(stored.rank), count) != (auteur.score, str(auteur.rank), len(auteur.validation_dates))
 
-        with self.session_maker.begin() as session:  # type: ignore
+    def insert_validations(self, session, rows: list[dict]) -> None:
+        """Inserts validations in one statement, ignoring the ones already there"""
+        if rows:
+            session.execute(sqlite_insert(Validation).on_conflict_do_nothing(), rows)
 
-            challs_id = [i[0] for i in session.query(Challenge.idx).all()]
-            old_auteur = await self.get_user_from_db(idx)
-            old_id = [i.idx for i in session.merge(old_auteur).solves]
-            make_transient(old_auteur)
+    def update_solver_counts(self, session, challenge_ids) -> None:
+        """Recounts solvers and first solve of challenges whose validations changed, from the challenge_id index"""
+        if not challenge_ids:
+            return
 
-            full_auteur = await self.retreive_user(idx)
-            full_auteur = session.merge(full_auteur)
+        counts = {
+            idx: (count, first)
+            for idx, count, first in session.query(Validation.challenge_id, func.count(), func.min(Validation.date))
+                .filter(Validation.challenge_id.in_(challenge_ids))
+                .group_by(Validation.challenge_id)
+        }
 
-            for validation in full_auteur.validation_aut:
-                if validation.validation_challenge.idx not in challs_id:
-                    new_c = await self.add_challenge_to_db(validation.validation_challenge.idx, 0)
-                    if new_c:
-                        chall = session.merge(validation.validation_challenge)
-                        session.delete(chall)
-                        session.add(new_c)
+        for chall in session.query(Challenge).filter(Challenge.idx.in_(challenge_ids)):
+            chall.solver_count, chall.first_solve = counts.get(chall.idx, (0, None))
 
-                if validation.validation_challenge.idx not in old_id:
-                    new_vals.append(validation)
+    def delete_validations(self, session, idx: int) -> None:
+        """Deletes the validations of a user, their challenges lose a solver"""
+        challenge_ids = {i[0] for i in session.query(Validation.challenge_id).filter(Validation.auteur_id == idx)}
+        session.query(Validation).filter(Validation.auteur_id == idx).delete(synchronize_session=False)
+        self.update_solver_counts(session, challenge_ids)
 
-            for val in new_vals:
-                res = session.query(Auteur.username, Auteur.score).filter(Auteur.score > val.validation_auteur.score).order_by(Auteur.score.asc()).limit(1).one_or_none()
-                if res:
-                    user_above, user_score = res
-                else:
-                    #First person in scoreboard
-                    user_above, user_score = ("", 0)
+    async def fetch_user_update(self, idx: int) -> Optional[Callable]:
+        """Fetches a user and what it needs from the API without holding a transaction
+
+        Returns the function of a session applying the changes and returning the new solves, None if nothing changed"""
+
+        full_auteur = await self.retreive_user(idx)
+        if not full_auteur:
+            #Deleted from Root-Me
+            return None
+
+        dates = full_auteur.validation_dates
+
+        def diff(session) -> tuple[set, set, set]:
+            """Challenges solved since the last update, the ones already in database and the validations gone upstream, None if nothing changed"""
+            stored = session.query(Auteur.score, Auteur.rank, Auteur.last_validation).filter(Auteur.idx == idx).one_or_none()
+            if not stored:
+                #Removed while we were fetching it
+                return None
+
+            count = session.query(func.count()).filter(Validation.auteur_id == idx).scalar()
+
+            #Most users don't change between two polls
+            if not self.has_changed(stored, count, full_auteur):
+                self.update_counters[idx]['skipped'] += 1
+                return None
+
+            #Only validations from the latest stored one onwards can be new
+            watermark = stored.last_validation
+            candidates = {chall for chall, date in dates.items() if not watermark or date >= watermark}
+
+            old_ids = {i[0] for i in session.query(Validation.challenge_id).filter(Validation.auteur_id == idx, Validation.challenge_id.in_(candidates))}
+            new_ids = candidates - old_ids
+            gone_ids = set()
+
+            if count + len(new_ids) != len(dates):
+                #Something changed behind the watermark, diff everything
+                old_ids = {i[0] for i in session.query(Validation.challenge_id).filter(Validation.auteur_id == idx)}
+                new_ids = dates.keys() - old_ids
+                #Deleted challenges, without it the count would never match again
+                gone_ids = old_ids - dates.keys()
+
+            known_challs = {i[0] for i in session.query(Challenge.idx).filter(Challenge.idx.in_(new_ids))}
+
+            self.update_counters[idx]['processed'] += 1
+            return new_ids, known_challs, gone_ids
+
+        if not (res := await self.db.run(diff)):
+            return None
+        new_ids, known_challs, gone_ids = res
 
-                above = (user_above, user_score)
+        new_challs = await asyncio.gather(*(self.add_challenge_to_db(chall, 0) for chall in new_ids - known_challs))
 
-                if val.challenge_id:
-                    #Premium challenge are None, we can't notify them :(
-                    if len(val.validation_challenge.solvers) <= 3:
+        def apply(session) -> list[tuple[Validation, tuple[str, int], bool]]:
+            if not session.get(Auteur, idx):
+                #Removed while we were fetching it
+                return []
+
+            for new_c in new_challs:
+                if new_c:
+                    session.merge(new_c)
+                    self.global_stats = None
+
+            auteur = session.merge(full_auteur)
+            if dates:
+                auteur.last_validation = max(dates.values())
+            history.record(session, idx, auteur.score, auteur.rank)
+
+            self.insert_validations(session, make_validations(idx, {chall: dates[chall] for chall in new_ids}))
+            if gone_ids:
+                session.query(Validation).filter(Validation.auteur_id == idx, Validation.challenge_id.in_(gone_ids)).delete(synchronize_session=False)
+            self.update_solver_counts(session, new_ids | gone_ids)
+
+            new_vals = session.query(Validation).filter(Validation.auteur_id == idx, Validation.challenge_id.in_(new_ids)).all()
+
+            self.ladder.update(idx, auteur.username, auteur.score)
+            #Empty username for the first person in scoreboard
+            above = self.ladder.above(auteur.score)
+
+            solves = []
+            for val in new_vals:
+                #Premium challenge are None, we can't notify them :(
+                if val.validation_challenge and val.validation_auteur:
+                    if val.validation_challenge.solver_count <= 3:
                         is_blood = True
                     else:
                         is_blood = False
 
-                    self.notification_manager.add_solve_to_queue(val, above, is_blood)
+                    solves.append((val, above, is_blood))
+            return solves
 
+        return apply
 
+    def notify_solves(self, solves: list[tuple[Validation, tuple[str, int], bool]]) -> None:
+        """Queues the solves of a committed update"""
+        for val, above, is_blood in solves:
+            self.notification_manager.add_solve_to_queue(val, above, is_blood)
 
     async def search_user(self, username: str) -> list[Auteur]:
         """Search user by name"""
 
-        try:
-            auteurs = await self.rootme_api.search_user_by_name(username, 0, priority=0)
-        except UnknownUser:
-            #No user matches the username
-            return []
+        async def get_full_user(idx: int):
+            try:
+                return await self.rootme_api.get_user_by_id(idx, 0, INTERACTIVE_DEADLINE)
+            except RequestExpired:
+                return None
 
+        tasks = []
+        try:
+            async for auteurs in self.rootme_api.search_user_by_name(username, priority=0, deadline=INTERACTIVE_DEADLINE):
+                tasks += [asyncio.create_task(get_full_user(aut.idx)) for aut in auteurs]
+        except (UnknownUser, RequestExpired):
+            #No user matches the username, or the API is too busy to answer in time
+            pass
 
-        fulls_auteurs = await asyncio.gather(*[self.rootme_api.get_user_by_id(aut.idx, priority=0) for aut in auteurs])
+        fulls_auteurs = [aut for aut in await asyncio.gather(*tasks) if aut]
 
 
         return fulls_auteurs # type: ignore
@@ -232,98 +484,180 @@ class DatabaseManager():
         """Adds a user from the api if we don't already have it"""
 
         aut = await self.get_user_from_db(idx)
-        if not aut:
-            with self.session_maker.begin() as session: # type: ignore
-                full_auteur = await self.retreive_user(idx, priority=0)
-                full_auteur = session.merge(full_auteur)
-                global_scoreboard = session.query(Scoreboard).where(Scoreboard.name == 'global').one()
-                full_auteur.scoreboards.append(global_scoreboard)
-                session.add(full_auteur)
-            return full_auteur
-        else:
+        if aut:
             return aut
 
+        full_auteur = await self.retreive_user(idx, priority=0)
+        if not full_auteur:
+            return None
+        dates = full_auteur.validation_dates
+
+        def insert(session) -> Auteur:
+            auteur = session.merge(full_auteur)
+            if dates:
+                auteur.last_validation = max(dates.values())
+            history.record(session, idx, auteur.score, auteur.rank)
+            self.insert_validations(session, make_validations(idx, dates))
+            self.update_solver_counts(session, dates.keys())
+            global_scoreboard = session.query(Scoreboard).where(Scoreboard.name == 'global').one()
+            auteur.scoreboards.append(global_scoreboard)
+            session.add(auteur)
+            self.ladder.update(idx, auteur.username, auteur.score)
+            return auteur
+
+        full_auteur = await self.db.run(insert)
+        self.avatar_manager.refresh_in_background(idx)
+        return full_auteur
+
 
     async def update_users(self) -> None:
         """Updates all users"""
 
-        with self.session_maker.begin() as session: # type: ignore
-            await asyncio.gather(*(self.update_user(aut.idx) for aut in session.query(Auteur).all()))
+        def load(session) -> list[int]:
+            self.ladder = ScoreLadder.load(session)
+            return [i[0] for i in session.query(Auteur.idx).all()]
+
+        ids = await self.db.run(load)
+        results = await asyncio.gather(*(self.fetch_user_update(idx) for idx in ids), return_exceptions=True)
+
+        updates = []
+        for idx, result in zip(ids, results):
+            if isinstance(result, Exception):
+                print(f"Could not fetch the update of user {idx} : {result!r}")
+            elif result:
+                updates.append((idx, result))
 
+        def apply_all(session) -> list[tuple[Validation, tuple[str, int], bool]]:
+            return [solve for _, apply in updates for solve in apply(session)]
+
+        #The whole cycle is committed at once, a failing user only loses its own update
+        try:
+            self.notify_solves(await self.db.run(apply_all))
+        except Exception as error:
+            print(f"Batched update failed, applying users one by one : {error!r}")
+            #The ladder was changed by the users applied before the rollback
+            self.ladder = await self.db.run(ScoreLadder.load)
+
+            for idx, apply in updates:
+                try:
+                    self.notify_solves(await self.db.run(apply))
+                except Exception as error:
+                    print(f"Could not apply the update of user {idx} : {error!r}")
+                    self.ladder = await self.db.run(ScoreLadder.load)
+
+        if time.monotonic() - self.history_compacted > HISTORY_COMPACT_INTERVAL:
+            self.history_compacted = time.monotonic()
+            print(f"Score history : {await self.db.run(history.compact)} samples downsampled")
+
+        totals = sum(self.update_counters.values(), Counter())
+        print(f"Users updates : {totals['skipped']} unchanged, {totals['processed']} processed")
+        print(self.rootme_api.queue)
+        print(self.db)
         await asyncio.sleep(1)
 
+    async def get_history(self, idx: int, start: datetime, end: datetime = None) -> list[tuple[datetime, int, int]]:
+        """(date, score, rank) of a user between start and end"""
+
+        return await self.db.run(history.samples, idx, start, end)
+
+    async def get_gains(self, idx: int, days: int = 7) -> int:
+        """Points earned by a user in the last days"""
+
+        return await self.db.run(history.gains, idx, datetime.now() - timedelta(days=days))
+
+    def count_by_category(self, rows: list[tuple[str, int]]) -> dict:
+        """Counts keyed by Stats, 0 for the categories without any row"""
+        stats = {stat: 0 for stat in Stats}
+        for category, count in rows:
+            if category in CATEGORY_STATS:
+                stats[CATEGORY_STATS[category]] = count
+        return stats
+
     async def get_stats(self) -> dict:
         """Queries db for how many chall per category"""
 
-        with self.session_maker.begin() as session: # type: ignore
-            res = session.query(Challenge.category, func.count(Challenge.idx)).group_by(Challenge.category).all()
-            stats = {
-                Stats.APP_SCRIPT: next(x[1] for x in res if x[0] == 'App - Script'),
-                Stats.APP_SYSTEM: next(x[1] for x in res if x[0] == 'App - Système'),
-                Stats.CRACKING: next(x[1] for x in res if x[0] == 'Cracking'),
-                Stats.WEB_CLIENT: next(x[1] for x in res if x[0] == 'Web - Client'),
-                Stats.WEB_SERVER: next(x[1] for x in res if x[0] == 'Web - Serveur'),
-                Stats.FORENSICS: next(x[1] for x in res if x[0] == 'Forensic'),
-                Stats.REALIST: next(x[1] for x in res if x[0] == 'Réaliste'),
-                Stats.CRYPTANALYSIS: next(x[1] for x in res if x[0] == 'Cryptanalyse'),
-                Stats.NETWORK: next(x[1] for x in res if x[0] == 'Réseau'),
-                Stats.STEGANOGRAPHY: next(x[1] for x in res if x[0] == 'Stéganographie') ,
-                Stats.PROGRAMMING: next(x[1] for x in res if x[0] == 'Programmation')
-                                    }
+        def count(session) -> dict:
+            #Set from the database thread, an insertion can't happen between the query and the caching
+            self.global_stats = self.count_by_category(session.query(Challenge.category, func.count(Challenge.idx)).group_by(Challenge.category).all())
+            return self.global_stats
 
+        if (stats := self.global_stats) is None:
+            stats = await self.db.run(count)
 
         return stats
 
     async def get_stats_auteur(self, auteur: Auteur) -> dict:
         """Queries db for the stats of a single auteur"""
 
-        with self.session_maker.begin() as session: # type: ignore
+        return await self.db.run(lambda session: self.count_by_category(
+            session.query(Challenge.category, func.count(Challenge.idx))
+                .join(Validation, Validation.challenge_id == Challenge.idx)
+                .filter(Validation.auteur_id == auteur.idx)
+                .group_by(Challenge.category)
+                .all()
+        ))
 
-            auteur = session.merge(auteur)
 
-            solves = {
-                Stats.WEB_CLIENT : len([i for i in auteur.solves if i.category == 'Web - Client']),
-                Stats.APP_SCRIPT : len([i for i in auteur.solves if i.category == 'App - Script']),
-                Stats.PROGRAMMING : len([i for i in auteur.solves if i.category == 'Programmation']),
-                Stats.CRACKING : len([i for i in auteur.solves if i.category == 'Cracking']),
-                Stats.NETWORK : len([i for i in auteur.solves if i.category == 'Réseau']),
-                Stats.APP_SYSTEM : len([i for i in auteur.solves if i.category == 'App - Système']),
-                Stats.WEB_SERVER : len([i for i in auteur.solves if i.category == 'Web - Serveur']),
-                Stats.CRYPTANALYSIS : len([i for i in auteur.solves if i.category == 'Cryptanalyse']),
-                Stats.STEGANOGRAPHY : len([i for i in auteur.solves if i.category == 'Stéganographie']),
-                Stats.REALIST : len([i for i in auteur.solves if i.category == 'Réaliste']),
-                Stats.FORENSICS : len([i for i in auteur.solves if i.category == 'Forensic'])
-            }
+    async def get_scoreboard(self, name: str) -> Scoreboard:
+        """Retreives a scoreboard from db by name"""
 
-        return solves
+        return await self.db.run(lambda session: session.query(Scoreboard).filter(Scoreboard.name == name).one_or_none())
 
+    async def get_scoreboard_page(self, name: str, page: int, page_size: int = SCOREBOARD_PAGE_SIZE) -> tuple[list[tuple[int, str, int]], int]:
+        """(rank, username, score) of a page of a scoreboard, ranked by SQL, and the number of members"""
 
-    async def get_scoreboard(self, name: str) -> Scoreboard:
-        """Retreives a scoreboard from db by name"""
+        def query(session) -> tuple[list[tuple[int, str, int]], int]:
+            members = session.query(Auteur).join(association_table, association_table.c.auteur_id == Auteur.idx).filter(association_table.c.scoreboard_name == name)
+            total = members.count()
 
-        with self.session_maker.begin() as session: # type: ignore
-            scoreboard = session.query(Scoreboard).filter(Scoreboard.name == name).one_or_none()
-        return scoreboard
+            #Users with the same score share their rank
+            rank = func.dense_rank().over(order_by=Auteur.score.desc())
+            rows = members.with_entities(rank, Auteur.username, Auteur.score) \
+                .order_by(Auteur.score.desc(), Auteur.username, Auteur.idx) \
+                .limit(page_size).offset(page * page_size).all()
 
-    def get_all_scoreboards(self) -> list[Scoreboard]:
-        """Retreives all scoreboards"""
-        with self.session_maker.begin() as session: # type: ignore
-            scoreboard = session.query(Scoreboard).all()
-        return scoreboard
+            return [tuple(row) for row in rows], total
+
+        return await self.db.run(query)
+
+    async def get_all_scoreboards(self) -> list[str]:
+        """Names of all scoreboards"""
+
+        return await self.db.run(lambda session: [i[0] for i in session.query(Scoreboard.name).order_by(Scoreboard.name)])
+
+    async def get_user_scoreboards(self, idx: int) -> set[str]:
+        """Names of the scoreboards a user is part of"""
+
+        return await self.db.run(lambda session: {
+            i[0] for i in session.query(association_table.c.scoreboard_name).filter(association_table.c.auteur_id == idx)
+        })
+
+    async def get_solvers(self, idx: int) -> list[str]:
+        """Usernames of the solvers of a challenge, the first ones first"""
+
+        return await self.db.run(lambda session: [
+            i[0] for i in session.query(Auteur.username)
+                .join(Validation, Validation.auteur_id == Auteur.idx)
+                .filter(Validation.challenge_id == idx)
+                .order_by(Validation.date)
+        ])
 
     async def create_scoreboard(self, name: str) -> Scoreboard:
         """Creates a scoreboard """
-        with self.session_maker.begin() as session: # type: ignore
-            scoreboard = await self.get_scoreboard(name)
+
+        def create(session) -> Scoreboard:
+            scoreboard = session.query(Scoreboard).filter(Scoreboard.name == name).one_or_none()
             if not scoreboard:
                 scoreboard = Scoreboard(name=name)
                 session.add(scoreboard)
-        return scoreboard
+            return scoreboard
+
+        return await self.db.run(create)
 
     async def remove_scoreboard(self, name: str) -> bool:
         """Removes a scoreboard"""
 
-        with self.session_maker.begin() as session: # type: ignore
+        def remove(session) -> bool:
             scoreboard = session.query(Scoreboard).filter(Scoreboard.name == name).one_or_none()
             if not scoreboard:
                 res = False
@@ -331,12 +665,14 @@ class DatabaseManager():
                 res = True
                 scoreboard.users = []
                 session.delete(scoreboard)
-        return res
+            return res
+
+        return await self.db.run(remove)
 
     async def add_to_scoreboard(self, user_id: int, scoreboard_name: str) -> bool:
         """Adds a user to a scoreboard"""
 
-        with self.session_maker.begin() as session: # type: ignore
+        def add(session) -> bool:
             aut = session.query(Auteur).filter(Auteur.idx == user_id).one_or_none()
             scoreboard = session.query(Scoreboard).filter(Scoreboard.name == scoreboard_name).one_or_none()
             if not aut or not scoreboard:
@@ -344,13 +680,14 @@ class DatabaseManager():
             else:
                 aut.scoreboards.append(scoreboard)
                 res = True
+            return res
 
-        return res
+        return await self.db.run(add)
 
     async def remove_from_scoreboard(self, user_id: int, scoreboard_name: str) -> bool:
         """Remove a user from a scoreboard"""
 
-        with self.session_maker.begin() as session: # type: ignore
+        def remove(session) -> bool:
             aut = session.query(Auteur).filter(Auteur.idx == user_id).one_or_none()
             scoreboard = session.query(Scoreboard).filter(Scoreboard.name == scoreboard_name).one_or_none()
             if not aut or not scoreboard:
@@ -361,4 +698,6 @@ class DatabaseManager():
                     res = True
                 else:
                     res = False
-        return res
+            return res
+
+        return await self.db.run(remove)
@@ -0,0 +1,157 @@
+"""Module for the in-place migrations of existing databases
+
+Also a tool to migrate a database without starting the bot, from the RootMeBot folder:
+    python -m database.migrations /opt/db/rootme.db
+"""
+import os
+import sys
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateTable
+
+from database.models.base_model import Base
+from database.search import create_search_index
+
+#Fills a column from the existing rows, run once after the column is added and the indexes are created
+BACKFILLS = {
+    'challenges.solver_count': (
+        'UPDATE challenges SET solver_count = '
+        '(SELECT count(*) FROM validations WHERE validations.challenge_id = challenges.idx)'
+    ),
+    'challenges.first_solve': (
+        'UPDATE challenges SET first_solve = '
+        '(SELECT min(date) FROM validations WHERE validations.challenge_id = challenges.idx)'
+    ),
+    #fold() is registered by make_engine, the bot keeps these columns up to date afterwards
+    'auteurs.username_folded': 'UPDATE auteurs SET username_folded = fold(username)',
+    'challenges.title_folded': 'UPDATE challenges SET title_folded = fold(title)',
+}
+
+
+def copy_rows(connection, table, old_name: str) -> None:
+    """Copies the columns still declared on the model from old_name into the table, then drops old_name"""
+
+    columns = ', '.join(column['name'] for column in inspect(connection).get_columns(old_name) if column['name'] in table.columns)
+    connection.execute(text(f'INSERT OR IGNORE INTO {table.name} ({columns}) SELECT {columns} FROM {old_name}'))
+    connection.execute(text(f'DROP TABLE {old_name}'))
+
+
+def rebuild_changed_keys(engine: Engine) -> list[str]:
+    """Recreates the tables whose primary key changed, SQLite can't alter it in place
+
+    Each table is rebuilt in one explicit transaction, pysqlite would otherwise commit the DDL statements on their own.
+    A {table}_old left by an interrupted rebuild of an older version is copied back first.
+    The indexes are created afterwards by create_missing_indexes."""
+
+    rebuilt = []
+
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        for table in Base.metadata.sorted_tables:
+            old_name = f'{table.name}_old'
+            connection.exec_driver_sql('BEGIN')
+            try:
+                inspector = inspect(connection)
+                if inspector.has_table(old_name):
+                    print(f"Migration : finishing the interrupted rebuild of {table.name}")
+                    copy_rows(connection, table, old_name)
+                    rebuilt.append(table.name)
+                elif inspector.get_pk_constraint(table.name)['constrained_columns'] != [column.name for column in table.primary_key.columns]:
+                    print(f"Migration : rebuilding {table.name} with the primary key ({', '.join(table.primary_key.columns.keys())})")
+                    #Indexes keep their name when the table is renamed, they would collide with the new ones
+                    for index in inspector.get_indexes(table.name):
+                        connection.execute(text(f"DROP INDEX {index['name']}"))
+                    connection.execute(text(f'ALTER TABLE {table.name} RENAME TO {old_name}'))
+                    connection.execute(CreateTable(table))
+                    copy_rows(connection, table, old_name)
+                    rebuilt.append(table.name)
+                connection.exec_driver_sql('COMMIT')
+            except BaseException:
+                connection.exec_driver_sql('ROLLBACK')
+                raise
+
+    if rebuilt:
+        #Gives the space of the old tables back to the file system
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(text('VACUUM'))
+
+    return rebuilt
+
+
+def add_missing_columns(engine: Engine) -> list[str]:
+    """Adds the columns declared on the models but missing from tables created by an older version"""
+
+    inspector = inspect(engine)
+    added = []
+
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+
+            for column in table.columns:
+                if column.name not in existing:
+                    print(f"Migration : adding {table.name}.{column.name}")
+                    definition = f'{column.name} {column.type.compile(engine.dialect)}'
+                    if column.server_default is not None:
+                        definition += f" DEFAULT '{column.server_default.arg}'"
+                        if not column.nullable:
+                            definition += ' NOT NULL'
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {definition}'))
+                    added.append(f'{table.name}.{column.name}')
+
+    return added
+
+
+def create_missing_indexes(engine: Engine) -> None:
+    """Creates the indexes declared on the models, create_all skips them on tables that already exist"""
+
+    inspector = inspect(engine)
+
+    for table in Base.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+
+        for index in table.indexes:
+            if index.name not in existing:
+                print(f"Migration : creating index {index.name}")
+                index.create(bind=engine)
+
+
+def backfill(engine: Engine, columns: list[str]) -> None:
+    """Computes the values of newly added columns"""
+
+    with engine.begin() as connection:
+        for column in columns:
+            if column in BACKFILLS:
+                print(f"Migration : filling {column}")
+                connection.execute(text(BACKFILLS[column]))
+
+
+def migrate(engine: Engine) -> bool:
+    """Brings an existing database up to date with the models, safe to run on every start
+
+    Returns whether the full text search index is available"""
+    Base.metadata.create_all(bind=engine)
+    rebuilt = rebuild_changed_keys(engine)
+    added = add_missing_columns(engine)
+    create_missing_indexes(engine)
+    #Counts may have been made while an interrupted rebuild left the validations empty
+    if 'validations' in rebuilt:
+        added += [column for column in BACKFILLS if column not in added]
+    backfill(engine, added)
+    return create_search_index(engine)
+
+
+if __name__ == "__main__":
+    from database.engine import make_engine
+    #Tables are declared on Base when their models are imported
+    from database.models import avatar_model, bootstrap_model, catalog_model, history_model, scoreboard_model, unavailable_model, validation_model # pylint: disable=unused-import
+
+    path = sys.argv[1] if len(sys.argv) > 1 else 'rootme.db'
+    if not os.path.exists(path):
+        sys.exit(f"{path} doesn't exist")
+
+    before = os.path.getsize(path)
+    engine = make_engine(path)
+    migrate(engine)
+    engine.dispose()
+    print(f"{path} : {before // 1024} KiB -> {os.path.getsize(path) // 1024} KiB")
@@ -1,15 +1,26 @@
 """Module for the Auteur class"""
 from database.models.base_model import Base
-from sqlalchemy import Column, Integer, Text
+from database.search import fold
+from sqlalchemy import Column, DateTime, Integer, Text
+from sqlalchemy.orm import validates
 
 
 class Auteur(Base):
     """Class that represent a user"""
     __tablename__ = 'auteurs'
     idx = Column(Integer, primary_key=True)
-    username = Column(Text)
-    score = Column(Integer)
+    username = Column(Text, index=True)
+    score = Column(Integer, index=True)
     rank = Column(Text)
+    #Date of the latest stored validation, only newer ones need to be diffed
+    last_validation = Column(DateTime)
+    #fold(username) for the search index, set in Python so the index triggers work from any SQLite client
+    username_folded = Column(Text)
+
+    @validates('username')
+    def fold_username(self, _, username: str) -> str:
+        self.username_folded = fold(username)
+        return username
 
     def __str__(self) -> str:
         return (
@@ -0,0 +1,15 @@
+"""Module for the Avatar class"""
+from database.models.base_model import Base
+from sqlalchemy import Column, DateTime, Integer, Text
+
+
+class Avatar(Base):
+    """Class that caches the profile picture of a user, url is None when the user has none"""
+
+    __tablename__ = 'avatars'
+    auteur_id = Column(Integer, primary_key=True)
+    url = Column(Text)
+    expires = Column(DateTime, nullable=False)
+
+    def __str__(self) -> str:
+        return f'Avatar of {self.auteur_id} : {self.url} until {self.expires}'
@@ -0,0 +1,14 @@
+"""Module for the BootstrapChallenge class"""
+from database.models.base_model import Base
+from sqlalchemy import Boolean, Column, Integer
+
+
+class BootstrapChallenge(Base):
+    """Class that represents a challenge queued by the first run, kept until the bootstrap is over"""
+
+    __tablename__ = 'bootstrap_queue'
+    idx = Column(Integer, primary_key=True)
+    done = Column(Boolean, nullable=False, default=False)
+
+    def __str__(self) -> str:
+        return f'Bootstrap of challenge {self.idx} : {"done" if self.done else "pending"}'
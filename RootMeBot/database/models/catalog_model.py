@@ -0,0 +1,19 @@
+"""Module for the CatalogPage class"""
+from database.models.base_model import Base
+from sqlalchemy import Column, DateTime, Integer, String
+
+
+class CatalogPage(Base):
+    """Class that represents a checkpoint of a page of the challenge listing"""
+
+    __tablename__ = 'catalog_pages'
+    #Offset of the page in the listing
+    start = Column(Integer, primary_key=True)
+    #Hash of the challenges of the page once all of them are stored
+    hash = Column(String, nullable=False)
+    #Highest challenge id of the page
+    max_id = Column(Integer, nullable=False, default=0)
+    checked = Column(DateTime, nullable=False)
+
+    def __str__(self) -> str:
+        return f'Catalog page {self.start} : up to {self.max_id}, checked {self.checked}'
@@ -1,6 +1,8 @@
 """Module for the challenge class"""
 from database.models.base_model import Base
+from database.search import fold
 from sqlalchemy import Column, DateTime, Integer, Text
+from sqlalchemy.orm import validates
 
 
 class Challenge(Base):
@@ -8,12 +10,22 @@ class Challenge(Base):
 
     __tablename__ = 'challenges'
     idx = Column(Integer, primary_key=True)
-    title = Column(Text)
-    category = Column(Text)
+    title = Column(Text, index=True)
+    category = Column(Text, index=True)
     description = Column(Text)
     score = Column(Integer)
     difficulty = Column(Text)
     date = Column(DateTime)
+    #Maintained with the validations, counting the solvers doesn't load them
+    solver_count = Column(Integer, nullable=False, default=0, server_default='0')
+    first_solve = Column(DateTime)
+    #fold(title) for the search index, set in Python so the index triggers work from any SQLite client
+    title_folded = Column(Text)
+
+    @validates('title')
+    def fold_title(self, _, title: str) -> str:
+        self.title_folded = fold(title)
+        return title
 
     def __repr__(self) -> str:
         return f"Challenge {self.title}: {self.category} [{self.score}]"
@@ -0,0 +1,20 @@
+"""Module for the ScoreHistory class"""
+from database.models.base_model import Base
+from sqlalchemy import Column, Integer
+
+
+class ScoreHistory(Base):
+    """Class that represents the score and rank of a user from a point in time, until the next one"""
+
+    __tablename__ = 'score_history'
+    #A range of a user is read in primary key order, without an extra index
+    __table_args__ = {'sqlite_with_rowid': False}
+    auteur_id = Column(Integer, primary_key=True)
+    #Unix timestamp, smaller than a DateTime string
+    timestamp = Column(Integer, primary_key=True)
+    score = Column(Integer, nullable=False)
+    #None for users without points
+    rank = Column(Integer)
+
+    def __str__(self) -> str:
+        return f'History of {self.auteur_id} at {self.timestamp} : {self.score} points, rank {self.rank}'
@@ -15,5 +15,6 @@ class Scoreboard(Base):
     users = relationship("Auteur",
             secondary = association_table,
             backref=backref("scoreboards", lazy='subquery'),
-            lazy="subquery"
+            #Members are listed page by page with DatabaseManager.get_scoreboard_page
+            lazy="select"
     )
@@ -0,0 +1,16 @@
+"""Module for the UnavailableChallenge class"""
+from database.models.base_model import Base
+from sqlalchemy import Column, DateTime, Integer, Text
+
+
+class UnavailableChallenge(Base):
+    """Class that represents a challenge the API refused, premium or unknown, not requested again until rechecked"""
+
+    __tablename__ = 'unavailable_challenges'
+    idx = Column(Integer, primary_key=True)
+    #'premium' or 'unknown'
+    reason = Column(Text, nullable=False)
+    checked = Column(DateTime, nullable=False)
+
+    def __str__(self) -> str:
+        return f'Challenge {self.idx} unavailable ({self.reason}), checked {self.checked}'
@@ -2,7 +2,7 @@
 from database.models.auteur_model import Auteur
 from database.models.base_model import Base
 from database.models.challenge_model import Challenge
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, Text
+from sqlalchemy import Column, DateTime, ForeignKey, Integer
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import relationship
 
@@ -11,9 +11,10 @@ class Validation(Base):
     """Class that represents the link between users and challenges"""
 
     __tablename__ = 'validations'
-    idx = Column(Text, primary_key=True)
-    auteur_id = Column(Integer, ForeignKey('auteurs.idx'), nullable=False)
-    challenge_id = Column(Integer, ForeignKey('challenges.idx'), nullable=False)
+    #Rows are stored in primary key order, the validations of a user are contiguous
+    __table_args__ = {'sqlite_with_rowid': False}
+    auteur_id = Column(Integer, ForeignKey('auteurs.idx'), primary_key=True)
+    challenge_id = Column(Integer, ForeignKey('challenges.idx'), primary_key=True, index=True)
     date = Column(DateTime)
 
     validation_auteur = relationship(Auteur, backref="validation_aut")
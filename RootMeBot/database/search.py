@@ -0,0 +1,85 @@
+"""Module for the full text search over usernames and challenge titles"""
+import unicodedata
+from html import unescape
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+#Search table -> (table, folded column) it indexes, rowids are the primary keys
+#The folded columns are filled by the models, so the triggers don't call an application function
+SEARCH_TABLES = {
+    'search_auteurs': ('auteurs', 'username_folded'),
+    'search_challenges': ('challenges', 'title_folded'),
+}
+
+#Trigrams can't match shorter searches, these scan the search table instead
+MIN_MATCH_LENGTH = 3
+
+#Errors of an SQLite built without FTS5, or older than the trigram tokenizer (3.34)
+MISSING_FTS5 = ('no such module: fts5', 'no such tokenizer: trigram')
+
+
+def fold(value: str) -> str:
+    """Unescaped, lowercase and without accents, so 'Stéganographie &amp; co' is found with 'steganographie & co'"""
+    if value is None:
+        return None
+    decomposed = unicodedata.normalize('NFKD', unescape(value))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def create_search_index(engine: Engine) -> bool:
+    """Creates the FTS5 tables and the triggers keeping them in sync, returns False if SQLite lacks FTS5
+
+    The triggers are recreated on every start, older versions called fold() in them."""
+
+    existing = set(inspect(engine).get_table_names())
+
+    try:
+        with engine.begin() as connection:
+            for search_table, (table, column) in SEARCH_TABLES.items():
+                connection.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS {search_table} USING fts5(name, tokenize='trigram')"))
+
+                for trigger in ('insert', 'delete', 'update'):
+                    connection.execute(text(f"DROP TRIGGER IF EXISTS {search_table}_{trigger}"))
+                connection.execute(text(
+                    f"CREATE TRIGGER {search_table}_insert AFTER INSERT ON {table} BEGIN "
+                    f"INSERT INTO {search_table}(rowid, name) VALUES (new.idx, new.{column}); END"
+                ))
+                connection.execute(text(
+                    f"CREATE TRIGGER {search_table}_delete AFTER DELETE ON {table} BEGIN "
+                    f"DELETE FROM {search_table} WHERE rowid = old.idx; END"
+                ))
+                connection.execute(text(
+                    f"CREATE TRIGGER {search_table}_update AFTER UPDATE OF {column} ON {table} BEGIN "
+                    f"UPDATE {search_table} SET name = new.{column} WHERE rowid = old.idx; END"
+                ))
+
+                if search_table not in existing:
+                    print(f"Migration : indexing {table}.{column} for search")
+                    connection.execute(text(f"INSERT INTO {search_table}(rowid, name) SELECT idx, {column} FROM {table}"))
+    except OperationalError as error:
+        if not any(message in str(error.orig) for message in MISSING_FTS5):
+            raise
+        print(f"Search index unavailable, falling back to LIKE : {error.orig}")
+        return False
+
+    return True
+
+
+def search_ids(session, search_table: str, search: str, limit: int) -> list[int]:
+    """Primary keys matching the search, exact names first, then prefixes, then by relevance"""
+
+    folded = fold(search)
+    params = {'folded': folded, 'prefix': folded.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%', 'limit': limit}
+    order = "ORDER BY name = :folded DESC, name LIKE :prefix ESCAPE '\\' DESC"
+
+    if len(folded) >= MIN_MATCH_LENGTH:
+        #Quoted as a phrase, so the search can't be read as FTS5 syntax
+        params['query'] = '"' + folded.replace('"', '""') + '"'
+        statement = f"SELECT rowid FROM {search_table} WHERE name MATCH :query {order}, rank LIMIT :limit"
+    else:
+        params['pattern'] = '%' + params['prefix']
+        statement = f"SELECT rowid FROM {search_table} WHERE name LIKE :pattern ESCAPE '\\' {order}, length(name) LIMIT :limit"
+
+    return [row[0] for row in session.execute(text(statement), params)]
@@ -0,0 +1,20 @@
+"""Module for the negative cache of challenges the API refused
+
+Premium challenges answer 401 to every request, and validations of them come back every polling cycle,
+so refused ids are remembered and only requested again UNAVAILABLE_RECHECK seconds later."""
+from datetime import datetime
+
+from database.models.unavailable_model import UnavailableChallenge
+
+
+def load(session) -> dict[int, datetime]:
+    """Challenge id -> when it was last refused"""
+    return dict(session.query(UnavailableChallenge.idx, UnavailableChallenge.checked))
+
+
+def remember(session, idx: int, reason: str, now: datetime) -> None:
+    session.merge(UnavailableChallenge(idx=idx, reason=reason, checked=now))
+
+
+def forget(session, idx: int) -> None:
+    session.query(UnavailableChallenge).filter(UnavailableChallenge.idx == idx).delete(synchronize_session=False)
@@ -0,0 +1,134 @@
+"""Benchmark of the database queries of a polling cycle, with and without the storage profile
+
+Run it from the RootMeBot folder:
+    python -m mock.dbbench --users 2000 --challenges 600
+
+Both databases hold the same synthetic population. The baseline one has default pragmas and the schema of the first
+version of the bot, validations keyed by a text id and no secondary index.
+"""
+import argparse
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+from api.extract import make_validations
+from database.engine import make_engine
+from database.migrations import migrate
+from database.models.auteur_model import Auteur
+from database.models.challenge_model import Challenge
+from database.models.validation_model import Validation
+from sqlalchemy import func, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import sessionmaker
+
+from mock.migrationtest import BASELINE_SCHEMA
+from mock.population import Population
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark of the database queries')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--challenges', type=int, default=600)
+    parser.add_argument('--solve-rate', type=float, default=0.1)
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each query, the best one is kept')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def build(path: str, tuned: bool, population: Population):
+    """Database filled with the population, returns its session maker and the insert time"""
+
+    if tuned:
+        engine = make_engine(path)
+        migrate(engine)
+    else:
+        engine = make_engine(path, pragmas={})
+        with engine.begin() as connection:
+            for statement in BASELINE_SCHEMA:
+                connection.execute(text(statement))
+
+    session_maker = sessionmaker(engine, expire_on_commit=False)
+
+    with session_maker.begin() as session: # type: ignore
+        for idx, chall in population.challenges.items():
+            values = {'idx': idx, 'title': chall['titre'], 'category': chall['rubrique'], 'score': int(chall['score'])}
+            if tuned:
+                session.add(Challenge(**values))
+            else:
+                #The models map columns the baseline schema doesn't have
+                session.execute(text('INSERT INTO challenges (idx, title, category, score) VALUES (:idx, :title, :category, :score)'), values)
+
+    #One transaction per user, like the polling cycle does
+    start = time.monotonic()
+    for idx, user in population.users.items():
+        auteur = {'idx': idx, 'username': user['nom'], 'score': population.score(user), 'rank': user['position']}
+        rows = make_validations(idx, user['validations'])
+        with session_maker.begin() as session: # type: ignore
+            if tuned:
+                session.add(Auteur(**auteur))
+                session.flush()
+                session.execute(sqlite_insert(Validation).on_conflict_do_nothing(), rows)
+            else:
+                session.execute(text('INSERT INTO auteurs (idx, username, score, rank) VALUES (:idx, :username, :score, :rank)'), auteur)
+                if rows:
+                    #The first version keyed validations by "<auteur>_<challenge>"
+                    session.execute(text('INSERT OR IGNORE INTO validations VALUES (:idx, :auteur_id, :challenge_id, :date)'),
+                                    [dict(row, idx=f"{row['auteur_id']}_{row['challenge_id']}") for row in rows])
+    inserted = time.monotonic() - start
+
+    return session_maker, inserted
+
+
+def queries(population: Population) -> dict:
+    """Name -> function of a session, the queries behind a polling cycle and the commands"""
+
+    def diff_all_users(session) -> None:
+        for idx in population.users:
+            session.query(func.count()).filter(Validation.auteur_id == idx).scalar()
+            {i[0] for i in session.query(Validation.challenge_id).filter(Validation.auteur_id == idx)}
+
+    def solvers(session) -> None:
+        for idx in list(population.challenges)[:100]:
+            session.query(func.count()).filter(Validation.challenge_id == idx).scalar()
+
+    return {
+        'count + diff of every user': diff_all_users,
+        'solver count of 100 challenges': solvers,
+        'user by exact username': lambda session: [session.query(Auteur.idx, Auteur.username, Auteur.score, Auteur.rank)
+                                                   .filter(Auteur.username == f'user{i}').all() for i in range(1, 200)],
+        'score ladder': lambda session: session.query(Auteur.idx, Auteur.username, Auteur.score).order_by(Auteur.score).all(),
+        'challenges of a category': lambda session: [session.query(Challenge.idx).filter(Challenge.category == 'Cracking').all() for _ in range(100)],
+        'stats by category': lambda session: session.query(Challenge.category, func.count(Challenge.idx)).group_by(Challenge.category).all(),
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    population = Population(args.users, args.challenges, args.solve_rate, 0, args.seed)
+    directory = tempfile.mkdtemp(prefix='rootmebot-bench-')
+
+    results = defaultdict(dict)
+    for profile, tuned in (('baseline', False), ('tuned', True)):
+        session_maker, inserted = build(os.path.join(directory, f'{profile}.db'), tuned, population)
+        results['insert, one transaction per user'][profile] = inserted
+
+        for name, query in queries(population).items():
+            best = None
+            for _ in range(args.repeat):
+                start = time.monotonic()
+                with session_maker.begin() as session: # type: ignore
+                    query(session)
+                elapsed = time.monotonic() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results[name][profile] = best
+
+    validations = sum(len(user['validations']) for user in population.users.values())
+    print(f"{args.users} users, {args.challenges} challenges, {validations} validations")
+    print(f"{'':35} {'baseline':>10} {'tuned':>10}")
+    for name, times in results.items():
+        print(f"{name:35} {1000 * times['baseline']:>8.1f}ms {1000 * times['tuned']:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Load test of the polling engine against the mock server, without network
+
+Run it from the RootMeBot folder:
+    python -m mock.loadtest --users 300 --workers 4 --latency 0.2 --max-rate 5 --cycles 3
+
+Add --db-inline to run the database work on the event loop instead of its thread, and compare the loop lag.
+
+It accepts every option of mock.server, the server is started in the same process.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from mock.server import build_server, parse_args as parse_server_args
+
+
+def parse_args() -> tuple[argparse.Namespace, argparse.Namespace]:
+    parser = argparse.ArgumentParser(description='Load test of the polling engine')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=1 / 4.5, help='starting rate of the token bucket')
+    parser.add_argument('--api-max-rate', type=float, default=10, help='maximum rate of the token bucket')
+    parser.add_argument('--cycles', type=int, default=1, help='update_users cycles after the initial sync')
+    parser.add_argument('--solves-per-cycle', type=int, default=0, help='random solves added before each cycle')
+    parser.add_argument('--new-challenges', type=int, default=2, help='challenges added before the second catalog sync')
+    parser.add_argument('--db-inline', action='store_true', help='run the database work on the event loop')
+    args, server_args = parser.parse_known_args()
+    return args, parse_server_args(server_args)
+
+
+class LagMonitor():
+    """Measures how late the event loop wakes up a task sleeping in a loop"""
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self.interval = interval
+        self.reset()
+
+    def reset(self) -> None:
+        self.lags = []
+
+    async def run(self) -> None:
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.lags.append(time.monotonic() - start - self.interval)
+
+    def __str__(self) -> str:
+        if not self.lags:
+            return "loop lag : no sample"
+        lags = sorted(self.lags)
+        p99 = lags[int(0.99 * (len(lags) - 1))]
+        return f"loop lag : avg {1000 * sum(lags) / len(lags):.1f}ms, p99 {1000 * p99:.1f}ms, max {1000 * lags[-1]:.1f}ms"
+
+
+async def main() -> None:
+    args, server_args = parse_args()
+
+    server = build_server(server_args)
+    runner = await server.start(server_args.host, server_args.port)
+    url = f"http://{server_args.host}:{server_args.port}/"
+
+    directory = tempfile.mkdtemp(prefix='rootmebot-')
+    os.environ['API_BASE_URL'] = url
+    os.environ['IMAGES_BASE_URL'] = url
+    os.environ['CACHE_PATH'] = os.path.join(directory, 'http_cache.db')
+    os.environ['DB_THREAD'] = '0' if args.db_inline else '1'
+
+    #Constants are read at import time
+    from api.fetch import ApiRootMe
+    from api.ratelimit import TokenBucket
+    from database.manager import DatabaseManager
+    from notify.manager import NotificationManager
+
+    rootme_api = ApiRootMe(TokenBucket(rate=args.rate, max_rate=args.api_max_rate))
+    db_manager = DatabaseManager(rootme_api, NotificationManager(), os.path.join(directory, 'rootme.db'))
+    workers = rootme_api.start_workers(args.workers)
+    monitor = LagMonitor()
+    monitor_task = asyncio.create_task(monitor.run())
+
+    async def measure(name: str, coroutine) -> None:
+        requests = server.stats['requests']
+        monitor.reset()
+        start = time.monotonic()
+        await coroutine
+        elapsed = time.monotonic() - start
+        sent = server.stats['requests'] - requests
+        print(f"== {name}: {elapsed:.1f}s, {sent} requests, {sent / elapsed:.2f} req/s - {rootme_api.rate_limiter} - {monitor}")
+
+    await db_manager.create_scoreboard('global')
+    await measure('Challenge sync', db_manager.bootstrap_challenges())
+    await measure('Adding users', asyncio.gather(*(db_manager.add_user(idx) for idx in server.population.users)))
+    for cycle in range(args.cycles):
+        for _ in range(args.solves_per_cycle):
+            server.population.add_random_solve()
+        await measure(f'Polling cycle {cycle + 1}', db_manager.update_users())
+
+    #The first sync checkpoints the pages, the second one only diffs the tail
+    await measure('Catalog sync', db_manager.sync_challenges())
+    for _ in range(args.new_challenges):
+        server.population.add_challenge()
+    await measure('Catalog sync with new challenges', db_manager.sync_challenges())
+
+    print(rootme_api.queue)
+    print(rootme_api.cache)
+    print(db_manager.db)
+    print(f"Server : {dict(server.stats)}")
+
+    monitor_task.cancel()
+    for worker in workers:
+        worker.cancel()
+    await rootme_api.session.close()
+    await runner.cleanup()
+    db_manager.db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,147 @@
+"""Migration of a database created by the first version of the bot, including interrupted rebuilds
+
+Run it from the RootMeBot folder:
+    python -m mock.migrationtest --users 50 --challenges 200
+
+Exits with an error if a case loses or corrupts validations.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from sqlalchemy import inspect, text
+
+from database import migrations
+from database.engine import make_engine
+#Tables are declared on Base when their models are imported
+from database.models import avatar_model, bootstrap_model, catalog_model, history_model, scoreboard_model, unavailable_model, validation_model # pylint: disable=unused-import
+
+#Schema of the first version, validations were keyed by a text id
+BASELINE_SCHEMA = [
+    'CREATE TABLE auteurs (idx INTEGER PRIMARY KEY, username TEXT, score INTEGER, rank TEXT)',
+    'CREATE TABLE challenges (idx INTEGER PRIMARY KEY, title TEXT, category TEXT, description TEXT, score INTEGER, difficulty TEXT, date DATETIME)',
+    'CREATE TABLE validations (idx TEXT PRIMARY KEY, auteur_id INTEGER NOT NULL REFERENCES auteurs(idx), '
+    'challenge_id INTEGER NOT NULL REFERENCES challenges(idx), date DATETIME)',
+]
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Checks of the migration of a database created by the first version')
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--challenges', type=int, default=11, help='challenges, each of them solved by every user')
+    parser.add_argument('--directory', help='where the databases are kept, a temporary folder by default')
+    return parser.parse_args()
+
+
+def build_baseline(path: str, args: argparse.Namespace) -> int:
+    """Baseline database with every user solving every challenge, returns the number of validations"""
+
+    #Left by a previous run in the same directory
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    engine = make_engine(path, pragmas={})
+    with engine.begin() as connection:
+        for statement in BASELINE_SCHEMA:
+            connection.execute(text(statement))
+        for chall in range(1, args.challenges + 1):
+            connection.execute(text("INSERT INTO challenges (idx, title, category, score) VALUES (:idx, :title, 'Web - Serveur', 10)"),
+                               {'idx': chall, 'title': f'Challenge {chall}'})
+        for user in range(1, args.users + 1):
+            connection.execute(text("INSERT INTO auteurs (idx, username, score, rank) VALUES (:idx, :name, 0, '1')"), {'idx': user, 'name': f'user{user}'})
+            for chall in range(1, args.challenges + 1):
+                connection.execute(text("INSERT INTO validations VALUES (:idx, :user, :chall, '2022-01-01 00:00:00.000000')"),
+                                   {'idx': f'{user}_{chall}', 'user': user, 'chall': chall})
+    engine.dispose()
+    return args.users * args.challenges
+
+
+def check_migrated(path: str, expected: int, args: argparse.Namespace) -> None:
+    engine = make_engine(path)
+    inspector = inspect(engine)
+
+    assert inspector.get_pk_constraint('validations')['constrained_columns'] == ['auteur_id', 'challenge_id'], 'validations not rebuilt'
+    assert not inspector.has_table('validations_old'), 'validations_old left behind'
+
+    with engine.connect() as connection:
+        assert connection.execute(text('SELECT count(*) FROM validations')).scalar() == expected, 'validations lost'
+        counts = {row[0] for row in connection.execute(text('SELECT solver_count FROM challenges'))}
+        assert counts == {args.users}, f'wrong solver counts {counts}'
+    engine.dispose()
+
+
+def case_fresh(args: argparse.Namespace) -> None:
+    path = os.path.join(args.directory, 'fresh.db')
+    expected = build_baseline(path, args)
+    migrations.migrate(make_engine(path))
+    check_migrated(path, expected, args)
+
+
+def case_interrupted(args: argparse.Namespace) -> None:
+    """Crash before the old table is dropped, the rebuild must roll back and succeed on the next start"""
+
+    path = os.path.join(args.directory, 'interrupted.db')
+    expected = build_baseline(path, args)
+    copy_rows = migrations.copy_rows
+
+    def crash(connection, table, old_name: str) -> None:
+        connection.execute(text(f'INSERT OR IGNORE INTO {table.name} SELECT auteur_id, challenge_id, date FROM {old_name}'))
+        raise KeyboardInterrupt
+
+    migrations.copy_rows = crash
+    try:
+        migrations.migrate(make_engine(path))
+        raise AssertionError('the crash was not injected')
+    except KeyboardInterrupt:
+        pass
+    finally:
+        migrations.copy_rows = copy_rows
+
+    engine = make_engine(path)
+    assert inspect(engine).get_pk_constraint('validations')['constrained_columns'] == ['idx'], 'partial rebuild committed'
+    engine.dispose()
+
+    migrations.migrate(make_engine(path))
+    check_migrated(path, expected, args)
+
+
+def case_leftover(args: argparse.Namespace) -> None:
+    """State left by the non transactional rebuild of an older version : rows in validations_old, an empty validations"""
+
+    path = os.path.join(args.directory, 'leftover.db')
+    expected = build_baseline(path, args)
+
+    engine = make_engine(path)
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE validations RENAME TO validations_old'))
+        connection.execute(text('CREATE TABLE validations (auteur_id INTEGER NOT NULL, challenge_id INTEGER NOT NULL, date DATETIME, '
+                                'PRIMARY KEY (auteur_id, challenge_id)) WITHOUT ROWID'))
+    engine.dispose()
+
+    migrations.migrate(make_engine(path))
+    check_migrated(path, expected, args)
+
+
+def main() -> None:
+    args = parse_args()
+    if args.directory:
+        os.makedirs(args.directory, exist_ok=True)
+    else:
+        args.directory = tempfile.mkdtemp(prefix='rootmebot-migration-')
+    failed = False
+
+    for case in (case_fresh, case_interrupted, case_leftover):
+        try:
+            case(args)
+            print(f"{case.__name__} : OK")
+        except AssertionError as error:
+            print(f"{case.__name__} : FAILED, {error}")
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Module that generates a synthetic Root-Me population for the mock server"""
+import random
+from datetime import datetime, timedelta
+
+CATEGORIES = [
+    ('App - Script', 1),
+    ('App - Système', 2),
+    ('Cracking', 3),
+    ('Cryptanalyse', 4),
+    ('Forensic', 5),
+    ('Programmation', 6),
+    ('Réaliste', 7),
+    ('Réseau', 8),
+    ('Stéganographie', 9),
+    ('Web - Client', 10),
+    ('Web - Serveur', 11),
+]
+
+DIFFICULTIES = ['Très facile', 'Facile', 'Moyen', 'Difficile', 'Très difficile']
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class Population():
+    """Class that holds synthetic challenges and users, with the payload shapes of the real API"""
+
+    def __init__(self, users: int = 200, challenges: int = 550, solve_rate: float = 0.1, premium_rate: float = 0.02, seed: int = 0) -> None:
+        self.random = random.Random(seed)
+        self.start = datetime(2010, 1, 1)
+
+        self.challenges = {}
+        self.premium = set()
+        for idx in range(1, challenges + 1):
+            self.challenges[idx] = self.make_challenge(idx)
+            if self.random.random() < premium_rate:
+                self.premium.add(idx)
+
+        self.users = {}
+        for idx in range(1, users + 1):
+            self.users[idx] = {
+                'id_auteur': str(idx),
+                'nom': f'user{idx}',
+                'validations': {},
+                'avatar': self.random.choice(['png', 'jpg', None]),
+            }
+            for chall_id in self.challenges:
+                if self.random.random() < solve_rate:
+                    self.users[idx]['validations'][chall_id] = self.random_date()
+
+        self.update_positions()
+
+    def random_date(self) -> datetime:
+        return self.start + timedelta(seconds=self.random.randrange(10 * 365 * 24 * 3600))
+
+    def make_challenge(self, idx: int) -> dict:
+        category, id_rubrique = self.random.choice(CATEGORIES)
+        difficulty = self.random.randrange(len(DIFFICULTIES))
+
+        return {
+            'id_challenge': str(idx),
+            #Titles are HTML escaped by the API
+            'titre': f'Challenge {idx} &amp; co' if idx % 7 == 0 else f'Challenge {idx}',
+            'soustitre': f'Synthetic challenge number {idx}',
+            'rubrique': category,
+            'id_rubrique': str(id_rubrique),
+            'score': str(5 * (difficulty + 1) * self.random.randint(1, 5)),
+            'difficulte': DIFFICULTIES[difficulty],
+            'date_publication': self.random_date().strftime(DATE_FORMAT),
+        }
+
+    def score(self, user: dict) -> int:
+        return sum(int(self.challenges[idx]['score']) for idx in user['validations'])
+
+    def update_positions(self) -> None:
+        """Ranks users by score, users without points have no position"""
+        ranked = sorted(self.users.values(), key=self.score, reverse=True)
+        for position, user in enumerate(ranked, start=1):
+            user['position'] = str(position) if self.score(user) else ''
+
+    def add_random_solve(self) -> None:
+        """Makes a random user solve a challenge they haven't solved yet"""
+        user = self.users[self.random.choice(list(self.users))]
+        unsolved = [idx for idx in self.challenges if idx not in user['validations']]
+        if unsolved:
+            user['validations'][self.random.choice(unsolved)] = datetime.now().replace(microsecond=0)
+            self.update_positions()
+
+    def add_challenge(self) -> None:
+        """Publishes a new challenge"""
+        idx = max(self.challenges) + 1
+        self.challenges[idx] = self.make_challenge(idx)
+
+    def auteur_payload(self, idx: int) -> dict:
+        user = self.users[idx]
+        return {
+            'id_auteur': user['id_auteur'],
+            'nom': user['nom'],
+            'statut': '6forum',
+            'score': str(self.score(user)),
+            'position': user['position'],
+            'validations': [
+                {
+                    'id_challenge': str(chall_id),
+                    'titre': self.challenges[chall_id]['titre'],
+                    'id_rubrique': self.challenges[chall_id]['id_rubrique'],
+                    'date': date.strftime(DATE_FORMAT),
+                }
+                for chall_id, date in sorted(user['validations'].items(), key=lambda v: v[1], reverse=True)
+            ],
+        }
+
+    def challenge_payload(self, idx: int) -> dict:
+        return dict(self.challenges[idx])
@@ -0,0 +1,91 @@
+"""Checks of the request scheduler ordering, without network
+
+Run it from the RootMeBot folder:
+    python -m mock.schedulertest
+
+Exits with an error if a case fails.
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from api.scheduler import PriorityEntry, RequestScheduler
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Checks of the request scheduler ordering')
+    parser.add_argument('--aging', type=float, default=30, help='seconds before a waiting entry is promoted')
+    parser.add_argument('--backlog', type=int, default=100, help='entries of the aged polling backlog')
+    return parser.parse_args()
+
+
+def queue_aged(scheduler: RequestScheduler, priority: int, count: int, age: float) -> list[PriorityEntry]:
+    entries = []
+    for i in range(count):
+        entry = PriorityEntry(priority, f'P{priority}-{i}')
+        entry.enqueued -= age
+        scheduler.put_nowait(entry)
+        entries.append(entry)
+    return entries
+
+
+def drain(scheduler: RequestScheduler) -> list:
+    order = []
+    while entry := scheduler.pop():
+        order.append(entry.data)
+    return order
+
+
+async def case_backlog_starvation(args: argparse.Namespace) -> None:
+    """A polling backlog older than the aging delay must not pass a fresh command"""
+
+    scheduler = RequestScheduler(args.aging)
+    queue_aged(scheduler, 1, args.backlog, args.aging + 1)
+    scheduler.put_nowait(PriorityEntry(0, 'command'))
+
+    position = drain(scheduler).index('command') + 1
+    assert position == 1, f'command served {position} of {args.backlog + 1}'
+
+
+async def case_background_aging(args: argparse.Namespace) -> None:
+    """Background entries still pass fresh polling ones once promoted to the top class"""
+
+    scheduler = RequestScheduler(args.aging)
+    queue_aged(scheduler, 2, 1, 2 * args.aging + 1)
+    queue_aged(scheduler, 1, 5, 0)
+
+    assert drain(scheduler)[0] == 'P2-0', 'aged background entry starved'
+
+
+async def case_deadline_behind(args: argparse.Namespace) -> None:
+    """An entry expires at its deadline even behind entries without one"""
+
+    expired = []
+    scheduler = RequestScheduler(args.aging, on_expired=expired.append)
+    queue_aged(scheduler, 0, 6, 0)
+    scheduler.put_nowait(PriorityEntry(0, 'command', time.monotonic() + 0.1))
+
+    await asyncio.sleep(0.2)
+    assert [entry.data for entry in expired] == ['command'], 'entry not expired at its deadline'
+    assert 'command' not in drain(scheduler), 'expired entry still served'
+
+
+async def main() -> None:
+    args = parse_args()
+    failed = False
+
+    for case in (case_backlog_starvation, case_background_aging, case_deadline_behind):
+        try:
+            await case(args)
+            print(f"{case.__name__} : OK")
+        except AssertionError as error:
+            print(f"{case.__name__} : FAILED, {error}")
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
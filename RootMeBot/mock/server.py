@@ -0,0 +1,220 @@
+"""Stand-in for the Root-Me API, to test and load test the bot without network
+
+Run it from the RootMeBot folder:
+    python -m mock.server --users 500 --challenges 600 --latency 0.2 --max-rate 2
+
+Then point the bot (or mock.loadtest) at it:
+    API_BASE_URL=http://127.0.0.1:8080/ IMAGES_BASE_URL=http://127.0.0.1:8080/ python main.py
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import Counter, deque
+
+from aiohttp import web
+
+from mock.population import Population
+
+PAGE_SIZE = 50
+
+
+class Faults():
+    """Latency, throttling and disconnections injected in every response"""
+
+    def __init__(self, latency: float = 0.0, max_rate: float = 0.0, throttle_rate: float = 0.0, retry_after: int = 5, disconnect_rate: float = 0.0, seed: int = 0) -> None:
+        self.latency = latency
+        self.max_rate = max_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.disconnect_rate = disconnect_rate
+        self.random = random.Random(seed)
+        self.recent = deque()
+
+    def over_rate(self) -> bool:
+        """Sliding window of one second, like a server side rate limit"""
+        if not self.max_rate:
+            return False
+
+        now = time.monotonic()
+        while self.recent and now - self.recent[0] > 1:
+            self.recent.popleft()
+        if len(self.recent) >= self.max_rate:
+            return True
+        self.recent.append(now)
+        return False
+
+
+class MockServer():
+    """Class that serves the population with the routes used by ApiRootMe"""
+
+    def __init__(self, population: Population, faults: Faults) -> None:
+        self.population = population
+        self.faults = faults
+        self.stats = Counter()
+
+        self.app = web.Application(middlewares=[self.inject_faults])
+        self.app.router.add_get('/challenges', self.challenges)
+        self.app.router.add_get('/challenges/', self.challenges)
+        self.app.router.add_get('/challenges/{idx:\\d+}', self.challenge)
+        self.app.router.add_get('/auteurs', self.auteurs)
+        self.app.router.add_get('/auteurs/{idx:\\d+}', self.auteur)
+        self.app.router.add_route('HEAD', '/IMG/auton{idx:\\d+}.{ext}', self.avatar)
+        self.app.router.add_get('/_stats', self.show_stats)
+
+    @web.middleware
+    async def inject_faults(self, request: web.Request, handler) -> web.StreamResponse:
+        if request.path == '/_stats':
+            return await handler(request)
+
+        self.stats['requests'] += 1
+
+        if self.faults.latency:
+            await asyncio.sleep(self.faults.random.uniform(0, 2 * self.faults.latency))
+
+        if self.faults.over_rate() or self.faults.random.random() < self.faults.throttle_rate:
+            self.stats['429'] += 1
+            return web.Response(status=429, headers={'Retry-After': str(self.faults.retry_after)})
+
+        if self.faults.random.random() < self.faults.disconnect_rate:
+            self.stats['disconnects'] += 1
+            request.transport.close()
+            return web.Response(status=500)
+
+        response = await handler(request)
+        self.stats[str(response.status)] += 1
+        return response
+
+    def json(self, request: web.Request, payload) -> web.Response:
+        """JSON response with an ETag, 304 when the client already has it"""
+        body = json.dumps(payload).encode()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(body=body, content_type='application/json', headers={'ETag': etag})
+
+    @staticmethod
+    def page(items: list, start: int, href: str) -> list:
+        """Paginated listing: a dict of positions then the links"""
+        page = {str(i): item for i, item in enumerate(items[start:start + PAGE_SIZE])}
+        links = []
+        if start:
+            links.append({'rel': 'previous', 'href': f'{href}{max(0, start - PAGE_SIZE)}'})
+        if start + PAGE_SIZE < len(items):
+            links.append({'rel': 'next', 'href': f'{href}{start + PAGE_SIZE}'})
+        return [page] + links
+
+    async def challenges(self, request: web.Request) -> web.Response:
+        self.stats['challenges'] += 1
+        start = int(request.query.get('debut_challenges', 0))
+
+        items = [
+            {key: chall[key] for key in ('id_challenge', 'titre', 'id_rubrique', 'score')}
+            for chall in self.population.challenges.values()
+        ]
+        return self.json(request, self.page(items, start, '/challenges?debut_challenges='))
+
+    async def challenge(self, request: web.Request) -> web.Response:
+        self.stats['challenge'] += 1
+        idx = int(request.match_info['idx'])
+
+        if idx not in self.population.challenges:
+            return web.Response(status=404)
+        if idx in self.population.premium:
+            return web.Response(status=401)
+        return self.json(request, self.population.challenge_payload(idx))
+
+    async def auteurs(self, request: web.Request) -> web.Response:
+        self.stats['auteurs'] += 1
+        name = request.query.get('nom', '').lower()
+        start = int(request.query.get('count', 0))
+
+        items = [
+            {'id_auteur': user['id_auteur'], 'nom': user['nom']}
+            for user in self.population.users.values() if name in user['nom'].lower()
+        ]
+        if not items:
+            return web.Response(status=404)
+        return self.json(request, self.page(items, start, f'/auteurs?nom={name}&count='))
+
+    async def auteur(self, request: web.Request) -> web.Response:
+        self.stats['auteur'] += 1
+        idx = int(request.match_info['idx'])
+
+        if idx not in self.population.users:
+            return web.Response(status=404)
+        return self.json(request, self.population.auteur_payload(idx))
+
+    async def avatar(self, request: web.Request) -> web.Response:
+        self.stats['avatar'] += 1
+        user = self.population.users.get(int(request.match_info['idx']))
+
+        if user and user['avatar'] == request.match_info['ext']:
+            return web.Response(status=200)
+        return web.Response(status=404)
+
+    async def show_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(dict(self.stats))
+
+    async def simulate(self, solves_per_minute: float, challenges_per_hour: float) -> None:
+        """Makes the population evolve while the bot polls it"""
+        if not solves_per_minute and not challenges_per_hour:
+            return
+
+        while True:
+            await asyncio.sleep(1)
+            if self.population.random.random() < solves_per_minute / 60:
+                self.population.add_random_solve()
+            if self.population.random.random() < challenges_per_hour / 3600:
+                self.population.add_challenge()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8080) -> web.AppRunner:
+        runner = web.AppRunner(self.app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+def parse_args(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Stand-in for the Root-Me API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--challenges', type=int, default=550)
+    parser.add_argument('--solve-rate', type=float, default=0.1, help='probability that a user solved a challenge')
+    parser.add_argument('--premium-rate', type=float, default=0.02, help='share of challenges answering 401')
+    parser.add_argument('--latency', type=float, default=0.0, help='mean latency in seconds')
+    parser.add_argument('--max-rate', type=float, default=0.0, help='requests per second before answering 429, 0 for no limit')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='probability of a random 429')
+    parser.add_argument('--retry-after', type=int, default=5)
+    parser.add_argument('--disconnect-rate', type=float, default=0.0, help='probability of closing the connection')
+    parser.add_argument('--solves-per-minute', type=float, default=0.0)
+    parser.add_argument('--challenges-per-hour', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(args)
+
+
+def build_server(args: argparse.Namespace) -> MockServer:
+    population = Population(args.users, args.challenges, args.solve_rate, args.premium_rate, args.seed)
+    faults = Faults(args.latency, args.max_rate, args.throttle_rate, args.retry_after, args.disconnect_rate, args.seed)
+    return MockServer(population, faults)
+
+
+async def main() -> None:
+    args = parse_args()
+    server = build_server(args)
+    await server.start(args.host, args.port)
+
+    print(f"Mock Root-Me API on http://{args.host}:{args.port}/ : {args.users} users, {args.challenges} challenges")
+    try:
+        await server.simulate(args.solves_per_minute, args.challenges_per_hour)
+        await asyncio.Event().wait()
+    finally:
+        print(dict(server.stats))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
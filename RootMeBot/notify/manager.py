@@ -1,9 +1,11 @@
 """Module that manages sending notification on discord"""
+from datetime import datetime
+
 from classes.auteur import AuteurData
 from classes.challenge import ChallengeData
 
 
-Solves = list[tuple[AuteurData, ChallengeData, int, bool]]
+Solves = list[tuple[AuteurData, ChallengeData, tuple[str, int], bool, datetime]]
 Challenges = list[ChallengeData]
 Solve = tuple[AuteurData, ChallengeData]
 
@@ -24,7 +26,7 @@ class NotificationManager():
         if not challenge:
             return
 
-        self.new_solves.append((auteur, challenge, above, is_blood))
+        self.new_solves.append((auteur, challenge, above, is_blood, val.date)) # type: ignore
 
     def get_solve_queue(self) -> Solves:
         """Returns the currently enqueued solves"""
@@ -44,5 +46,5 @@ class NotificationManager():
 
     def __str__(self) -> str:
         output = f"""Challenge queue : [{', '.join([str(chall.idx) for chall in self.new_challenges])}]\n"""
-        output += f"""Solves in queue : [{', '.join([str(chall.idx) + ' by ' + aut.username for aut, chall, _ in self.new_solves])}]"""
+        output += f"""Solves in queue : [{', '.join([str(chall.idx) + ' by ' + aut.username for aut, chall, *_ in self.new_solves])}]"""
         return output
@@ -1,6 +1,7 @@
 import discord
 import aiohttp
 import code
+from datetime import datetime, timedelta
 from html import unescape
 
 from discord.utils import escape_markdown
@@ -9,7 +10,7 @@ from discord.channel import TextChannel
 from database.manager import DatabaseManager
 
 from classes.enums import Color, Stats
-from classes.views import ManageView, ScoreboardView, MultipleChallFoundView, MultipleUserFoundView
+from classes.views import ManageView, ScoreboardView, ScoreboardPageView, MultipleChallFoundView, MultipleUserFoundView
 from constants import PING_ROLE_ROOTME
 
 from database.models.auteur_model import Auteur
@@ -21,15 +22,22 @@ import utils.messages as utils
 Auteurs = list[Auteur]
 Challenges = list[Challenge]
 
-async def init_start(channel: TextChannel) -> None:
-    """First time running message"""
+async def init_start(channel: TextChannel) -> discord.Message:
+    """First time running message, edited with the progress of the initialization"""
 
     message_title = f"Welcome ! :smile:"
 
     message = f'This seems to be the first time running the bot, please wait while the database is being initialized !'
 
     embed = discord.Embed(color=Color.INFO_BLUE.value, title=message_title, description=message)
-    await channel.send(embed=embed)
+    return await channel.send(embed=embed)
+
+async def init_progress(message: discord.Message, done: int, total: int, eta: float) -> None:
+    """Shows how many challenges are stored and the time left"""
+
+    embed = message.embeds[0]
+    embed.set_footer(text=f'{done}/{total} challenges, about {timedelta(seconds=int(eta))} left')
+    await message.edit(embed=embed)
 
 async def incorrect_usage(channel: TextChannel) -> None:
 
@@ -51,7 +59,7 @@ async def init_end(channel: TextChannel) -> None:
 
 
 
-async def send_new_solve(channel: TextChannel, chall: Challenge, aut: Auteur, above: tuple[str, int], is_blood: bool) -> None:
+async def send_new_solve(channel: TextChannel, chall: Challenge, aut: Auteur, above: tuple[str, int], is_blood: bool, date: datetime) -> None:
     """Posts a new solve in the right channel"""
 
     if is_blood:
@@ -63,13 +71,12 @@ async def send_new_solve(channel: TextChannel, chall: Challenge, aut: Auteur, ab
 
     message_title = f'New challenge solved by {escape_markdown(aut.username)} {emoji}'
 
-    val = [val for val in chall.validation_chall if val.auteur_id == aut.idx][0]
-
     message = f' • {unescape(chall.title)} ({chall.score} points)'
     message += f'\n • Category: {chall.category}'
     message += f'\n • Difficulty: {chall.difficulty}'
     message += f'\n • New score: {aut.score}'
-    message += f'\n • Date: {val.date.strftime("%d/%m/%y %Hh%Mm%Ss")}'
+    message += f'\n • Solvers: {chall.solver_count}'
+    message += f'\n • Date: {date.strftime("%d/%m/%y %Hh%Mm%Ss")}'
 
     embed = discord.Embed(color=Color.NEW_YELLOW.value, title=message_title, description=message)
 
@@ -95,7 +102,7 @@ async def send_new_challenge(channel: TextChannel, chall: Challenge) -> None:
 
 
 async def scoreboard_choice(channel: TextChannel, db_manager: DatabaseManager) -> None:
-    view = ScoreboardView(channel, db_manager)
+    view = ScoreboardView(channel, db_manager, await db_manager.get_all_scoreboards())
     await channel.send('Choose which scoreboard: ', view=view)
 
 
@@ -106,21 +113,34 @@ async def scoreboard(channel: TextChannel, database_manager: DatabaseManager, na
         await utils.cant_find_scoreboard(channel, name)
         return
 
-    users = sc.users
+    rows, total = await database_manager.get_scoreboard_page(sc.name, 0)
 
-    if not users:
+    if not total:
        embed = discord.Embed(color=0xff0000, title='Error', description=f'No users in scoreboard {sc.name} :frowning:')
+       await channel.send(embed=embed)
 
     else:
-       users.sort(key=lambda x: x.score, reverse=True)
-       message_title = f'Scoreboard {sc.name}'
-       message = ''
-       for user in users:
-           message += f' • • • {escape_markdown(user.username)} --> {user.score} \n'
+       view = ScoreboardPageView(database_manager, sc.name, total)
+       embed = scoreboard_page(sc.name, rows, 0, view.pages)
 
-       embed = discord.Embed(color=Color.SCOREBOARD_WHITE.value, title=message_title, description=message)
+       if view.pages > 1:
+           await channel.send(embed=embed, view=view)
+       else:
+           await channel.send(embed=embed)
 
-    await channel.send(embed=embed)
+
+def scoreboard_page(name: str, rows: list[tuple[int, str, int]], page: int, pages: int) -> discord.Embed:
+    """Embed of one page of a scoreboard"""
+
+    message_title = f'Scoreboard {name}'
+    message = ''
+    for rank, username, score in rows:
+        message += f' • • • {rank}. {escape_markdown(username)} --> {score} \n'
+
+    embed = discord.Embed(color=Color.SCOREBOARD_WHITE.value, title=message_title, description=message)
+    if pages > 1:
+        embed.set_footer(text=f'Page {page + 1}/{pages}')
+    return embed
 
 
 async def added_ok(channel: TextChannel, username: str) -> None:
@@ -189,43 +209,25 @@ async def many_users(channel: TextChannel, auteurs: Auteurs) -> None:
     await channel.send(embed=embed)
 
 
-async def who_solved(channel: TextChannel, chall: Challenge, Session) -> None:
+async def who_solved(channel: TextChannel, chall: Challenge, solvers: list[str]) -> None:
 
-    message_title = f'Solvers of {unescape(chall.title)} :sunglasses:'
+    message_title = f'Solvers of {unescape(chall.title)} ({chall.solver_count}) :sunglasses:'
     message = ''
-    with Session.begin() as session:
-        chall = session.merge(chall)
-
-        for auteur in chall.solvers:
-            message += f' • • • {escape_markdown(auteur.username)}\n'
+    for username in solvers:
+        message += f' • • • {escape_markdown(username)}\n'
 
 
     embed = discord.Embed(color=Color.INFO_BLUE.value, title=message_title, description=message)
+    if chall.first_solve:
+        embed.set_footer(text=f'First solved on {chall.first_solve.strftime("%d/%m/%y")}')
     await channel.send(embed=embed)
 
 
-async def many_challenges(channel: TextChannel, challenges: Challenges) -> None:
-
-    message_title = f'Multiple challenges found :thinking:'
-
-    embed = discord.Embed(color=Color.ERROR_RED.value, title=message_title)
-
-    first_column = ''
-    second_column = ''
-    for chall in challenges:
-        first_column += f'\n{unescape(chall.title)}'
-        second_column += f'\n{chall.idx}'
-
-    embed.add_field(name=f'Title', value=first_column, inline=True)
-    embed.add_field(name=f'ID', value=second_column, inline=True)
-
-    await channel.send(embed=embed)
-
-async def multiple_challenges(channel: TextChannel, challenges: Challenges, Session) -> None:
+async def multiple_challenges(channel: TextChannel, challenges: Challenges, db_manager: DatabaseManager) -> None:
 
     message = f'Multiple challenges found :'
 
-    view = MultipleChallFoundView(channel, challenges, Session)
+    view = MultipleChallFoundView(channel, challenges, db_manager)
 
     await channel.send(message, view=view)
 
@@ -250,7 +252,7 @@ async def multiple_users(channel: TextChannel, auteurs: Auteurs) -> None:
     await channel.send(embed=embed)
 
 
-async def profile(channel: TextChannel, data: tuple[str, int, int], solves: dict, stats_glob: list[int], image_url: str) -> None:
+async def profile(channel: TextChannel, data: tuple[str, int, int], solves: dict, stats_glob: list[int], image_url: str, gains: int = 0) -> None:
 
     username, score, rank = data
 
@@ -287,6 +289,8 @@ async def profile(channel: TextChannel, data: tuple[str, int, int], solves: dict
     embed.add_field(name=f'Rank: {rank}', value=second_column, inline=True)
 
     embed.set_thumbnail(url=image_url)
+    if gains:
+        embed.set_footer(text=f'+{gains} points this week')
 
 
     await channel.send(embed=embed)
@@ -325,7 +329,7 @@ async def add_scoreboard(channel: TextChannel, sc: Scoreboard) -> None:
 async def manage_user(channel: TextChannel, db_manager: DatabaseManager, auteur: Auteur) -> None:
     message_title = 'Edit user'
     message = f'Choose the scoreboards {escape_markdown(auteur.username)} is part of'
-    view = ManageView(db_manager, auteur)
+    view = ManageView(db_manager, auteur, await db_manager.get_all_scoreboards(), await db_manager.get_user_scoreboards(auteur.idx))
     embed = discord.Embed(color=Color.SCOREBOARD_WHITE.value, title=message_title, description=message)
     await channel.send(embed=embed, view=view)
 